@@ -2,18 +2,20 @@
 import os
 import typing
 
-from aws_cdk import Aws, CfnOutput, aws_ecr
+from aws_cdk import Aws, CfnOutput, Duration, aws_ecr
+from aws_cdk import aws_events as events
+from aws_cdk import aws_events_targets as targets
 from aws_cdk import aws_iam as iam  # Duration
 from aws_cdk import aws_lambda
 from constructs import Construct
 
-from database.infrastructure import ApiDB
+from database.infrastructure import ApiDB, EventsDB
 
 
 class SygnoAPI(Construct):
     """SygnoAPI CDK construct"""
 
-    def __init__(self, scope: Construct, id_: str, api_db: ApiDB):
+    def __init__(self, scope: Construct, id_: str, api_db: ApiDB, events_db: EventsDB):
         """Initialize API construct"""
         super().__init__(scope, id_)
 
@@ -56,6 +58,8 @@ class SygnoAPI(Construct):
         # set database permissions
         api_table = api_db.api_table
         api_table_arn = api_table.table_arn
+        events_table = events_db.events_table
+        events_table_arn = events_table.table_arn
         dynamodb_access_policy = iam.Policy(
             self,
             "DynamoTableAcsPlcy",
@@ -76,6 +80,8 @@ class SygnoAPI(Construct):
                     resources=[
                         api_table_arn,
                         f"{api_table_arn}/index/*",
+                        events_table_arn,
+                        f"{events_table_arn}/index/*",
                     ],
                 ),
             ],
@@ -122,6 +128,7 @@ class SygnoAPI(Construct):
                 "DEPLOY_ENV": deploy_env,
                 "COMPONENT": component,
                 "Api_TABLE_NAME": api_table.table_name,
+                "EVENTS_TABLE_NAME": events_table.table_name,
             },
             role=role
             # timeout=Duration.seconds(10),
@@ -132,6 +139,20 @@ class SygnoAPI(Construct):
             principal=iam.ServicePrincipal("apigateway.amazonaws.com"),
         )
 
+        # scheduled warm-up keeps a container with open connections and precomputed answers
+        warmup_rule = events.Rule(
+            self,
+            "WarmupRule",
+            description="Periodic warm-up event for the Api lambda function",
+            schedule=events.Schedule.rate(Duration.minutes(5)),
+        )
+        warmup_rule.add_target(
+            targets.LambdaFunction(
+                lambda_fn,
+                event=events.RuleTargetInput.from_object({"warmup": True}),
+            )
+        )
+
         lambda_key = self.node.try_get_context("lambda_arn_output_key")
         CfnOutput(
             self,
@@ -1,16 +1,23 @@
 """Fast API app and handler"""
 import argparse
+import functools
 import json
 import pathlib
+import random
+import time
 from decimal import Decimal
+from typing import Dict, List, Optional
 import uvicorn
-from fastapi import FastAPI, HTTPException, Security, status
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response, Security, status
 from fastapi.logger import logger
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.openapi.utils import get_openapi
 from fastapi.security import APIKeyHeader, APIKeyQuery
 from mangum import Mangum
-from pydantic import BaseSettings
+from botocore.exceptions import ClientError
+from starlette.concurrency import run_in_threadpool
 
 import sygno_api
 import sygno_api.api
@@ -18,12 +25,18 @@ from sygno_api.api.schema import (
     WriteResponse,
     ExposeResponse,
     ExposeRequest,
+    ExportRequest,
     WriteRequest,
 )
+from sygno_api.api import export, parse_raw_into_fraud_schema
+from sygno_api.api.cache import AnswerCache, SharedAnswerCache
+from sygno_api.api.feed import ReadingFeed
+from sygno_api.api.singleflight import SingleFlight
 from sygno_api.events import event_logger
+from sygno_api.utils import clients, profiling
 
 
-class Settings(BaseSettings):
+class Settings(clients.ClientSettings):
     """Settings will set default values if these are not found in environment variables"""
 
     application: str = "api-solution"
@@ -34,17 +47,84 @@ class Settings(BaseSettings):
         "cdk-solution-ApiDBApiTable9B6DE511-4CSR3FGGI5VI"
     )
 
-    events_table_name: str = (
-        "cdk-solution-ApiDBApiTable9B6DE511-4CSR3FGGI5VI"
-    )
+    # read from the deployed stack's outputs when unset, the lambda gets it from its environment
+    events_table_name: Optional[str] = None
+    stack_name: str = "cdk-solution"
+    events_table_output_key: str = "EventsTableName"
+
+    # days each event type is kept in the events table before its ttl expires it
+    event_retention_days: Dict[str, int] = {
+        "write_request": 30,
+        "write_response": 30,
+        "read_request": 7,
+        "read_response": 1,
+        "export_request": 30,
+    }
+    default_event_retention_days: int = 7
+    # days raw readings are kept once rolled up, None keeps them forever
+    raw_data_retention_days: Optional[int] = None
+
+    # concurrent sub-range queries per window and the items each sub-range should hold
+    range_fetch_workers: int = 4
+    range_fetch_target_items: int = 1000
+
+    # requests are profiled when they send this key in the x-profile header, or at the sample rate
+    profile_key: Optional[str] = None
+    profile_sample_rate: float = 0.0
+    # directory to write request profiles to, they are only logged when unset
+    profile_output_dir: Optional[str] = None
+
+    # "sync" writes readings before answering, "spool" answers 202 once they are in the local spool
+    # and drains the spool to the table in the background
+    ingest_mode: str = "sync"
+    spool_dir: str = "/tmp/sygno-spool"
+    spool_segment_bytes: int = 1000000
+    spool_segment_seconds: float = 5.0
+    spool_drain_workers: int = 1
+    # items per second written by the drainers, and items per batch
+    spool_drain_rate: float = 25.0
+    spool_batch_size: int = 25
+
+    # days of recent readings kept in memory per worker, 0 disables the hot tier
+    hot_tier_days: float = 0
+    hot_tier_max_items: int = 100000
+
+    # seconds computed expose answers are reused for, 0 only keeps the warm-up answers
+    expose_cache_seconds: float = 0.0
+    expose_cache_max_entries: int = 256
+    # expose answers precomputed by scheduled warm-up events, and the seconds they are kept for,
+    # longer than the 5 minute warm-up schedule so they are still there for the next request.
+    # latest is never cached, listing it only warms its query path
+    warmup_expose_types: List[str] = ["24h_devt", "24h_average", "7d_devt", "7d_average"]
+    warmup_cache_seconds: float = 360.0
+
+    # worker processes of the launched server, and the shared memory answer cache they use when > 1
+    server_workers: int = 1
+    # the server's port is appended, so servers on one host each get their own block
+    shared_cache_name: str = "sygno-expose-cache"
+    shared_cache_slots: int = 64
+    shared_cache_slot_bytes: int = 262144
+
+    # events buffered per feed subscriber before its oldest are dropped, and keep-alive interval
+    feed_queue_size: int = 100
+    feed_heartbeat_seconds: float = 15.0
 
 
 settings = Settings()
 
 logger.info(f" Initial API Service settings: {settings}")
 
+# every table handle is built on the one configured AWS session
+clients.configure(settings)
+
 sygno_api = sygno_api.api.sygnoAPI(settings)
 event_log = event_logger.EventLogger(settings)
+# identical concurrent expose requests share one query and aggregation
+expose_flight = SingleFlight()
+# recently computed expose answers
+expose_cache = AnswerCache(settings.expose_cache_seconds, settings.expose_cache_max_entries)
+# pushes accepted readings to streaming subscribers
+reading_feed = ReadingFeed(settings.feed_queue_size, settings.feed_heartbeat_seconds)
 
 # Define a list of valid API keys
 READ_KEYS = [
@@ -122,6 +202,51 @@ app.add_middleware(
 )
 
 
+async def profile_requests(request: Request, call_next):
+    """Profile requests selected by the x-profile header or the sampling rate"""
+
+    profile_header = request.headers.get("x-profile")
+    selected = bool(settings.profile_key) and profile_header == settings.profile_key
+    if not selected and random.random() >= settings.profile_sample_rate:
+        return await call_next(request)
+
+    profile = profiling.RequestProfile(request.url.path)
+    request.state.profile = profile
+    started = time.perf_counter()
+    response = await call_next(request)
+    profile.add_span("total", time.perf_counter() - started)
+
+    # span breakdown is returned inline, the cProfile capture is written out or logged
+    response.headers["Server-Timing"] = profile.server_timing()
+    response.headers["X-Profile-Id"] = profile.profile_id
+    # file writes and stats formatting stay off the event loop
+    if settings.profile_output_dir:
+        await run_in_threadpool(profile.dump, settings.profile_output_dir)
+    else:
+        stats_text = await run_in_threadpool(profile.stats_text)
+        logger.info(f"profile {profile.profile_id} for {profile.path}:\n{stats_text}")
+    return response
+
+
+# the profiling middleware is only installed when profiling is switched on
+if settings.profile_key or settings.profile_sample_rate:
+    app.middleware("http")(profile_requests)
+
+
+@app.on_event("startup")
+def start_spool_drainer():
+    """start draining the ingest spool"""
+    if sygno_api.spool_drainer:
+        sygno_api.spool_drainer.start()
+
+
+@app.on_event("shutdown")
+def stop_spool_drainer():
+    """stop draining the ingest spool, undrained items stay spooled for the next start"""
+    if sygno_api.spool_drainer:
+        sygno_api.spool_drainer.stop()
+
+
 @app.post(
     "/sygno/write_raw",
     response_model=WriteResponse,
@@ -129,33 +254,61 @@ app.add_middleware(
 )
 async def save_raw_data(
     item: WriteRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
     api_key: str = Security(get_write_api_key),
 ):
     """write raw climate data"""
 
     logger.info(f"writing climate item:{item}")
+    # in spool mode the write is acknowledged without dynamoDB, so its events are logged after the response
+    log_event = event_log.log
+    if sygno_api.spool_drainer:
+        log_event = functools.partial(background_tasks.add_task, event_log.log)
     # log request event
     request_data = json.loads(json.dumps(item.dict()), parse_float=Decimal)
-    event_log.log(
+    log_event(
         api_key, "write_request", request_data
     )
 
-    res = sygno_api.save_raw_data(item, api_key)
+    if sygno_api.spool_drainer:
+        res = await run_in_threadpool(sygno_api.spool_raw_data, item, api_key)
+        if res.status == "202":
+            response.status_code = status.HTTP_202_ACCEPTED
+    else:
+        res = sygno_api.save_raw_data(item, api_key)
     if not res:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to write {item} to database",
         )
+    if res.status in ("200", "202"):
+        # cached answers no longer include every reading
+        expose_cache.clear()
+        if reading_feed:
+            reading_feed.publish("reading", parse_raw_into_fraud_schema(res.data).dict(), res.data["sk"])
 
     # log response event
     response_data = {"response": res}
-    event_log.log(
+    log_event(
         api_key, "write_response", response_data
     )
 
     return res
 
 
+def get_expose_answer(item: ExposeRequest) -> Optional[ExposeResponse]:
+    """Get an expose answer from the cache, computing and caching it on a miss"""
+
+    key = item.json(sort_keys=True)
+    res = expose_cache.get(key)
+    if res is None:
+        res = sygno_api.get_data(item)
+        if res:
+            expose_cache.set(key, res)
+    return res
+
+
 @app.post(
     "/sygno/expose",
     response_model=ExposeResponse,
@@ -163,6 +316,7 @@ async def save_raw_data(
 )
 async def get_data(
     item: ExposeRequest,
+    request: Request,
     api_key: str = Security(get_read_api_key),
 ):
     """read climate data"""
@@ -174,7 +328,12 @@ async def get_data(
         api_key, "read_request", request_data
     )
 
-    res = sygno_api.get_data(item)
+    profile = getattr(request.state, "profile", None)
+    if profile:
+        # profiled requests compute their own answer so the capture reflects the real work
+        res = await run_in_threadpool(profile.run, sygno_api.get_data, item)
+    else:
+        res = await expose_flight.do(item.json(sort_keys=True), get_expose_answer, item)
     if not res:
         raise HTTPException(
             status_code=404,
@@ -187,15 +346,157 @@ async def get_data(
         api_key, "read_response", response_data
     )
 
+    if profile:
+        # serialized here instead of by FastAPI after the endpoint returns, so the profile can time it
+        with profile.span("serialization"):
+            return JSONResponse(jsonable_encoder(res, exclude_none=True))
     return res
 
 
-handler = Mangum(app)
+@app.post("/sygno/export")
+async def export_data(
+    item: ExportRequest,
+    api_key: str = Security(get_read_api_key),
+):
+    """stream raw climate data for a time range as ndjson, csv or parquet"""
+
+    logger.info(f"exporting climate data:{item}")
+    if item.format not in export.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported export format {item.format}",
+        )
+    if item.format == "parquet" and not export.parquet_available():
+        raise HTTPException(
+            status_code=501,
+            detail="Parquet export requires pyarrow to be installed",
+        )
+
+    # log request event
+    event_log.log(
+        api_key, "export_request", item.dict()
+    )
+
+    pages = sygno_api.get_export_pages(item)
+    return StreamingResponse(
+        export.export_items(pages, item.format),
+        media_type=export.EXPORT_FORMATS[item.format],
+        headers={
+            "Content-Disposition": f'attachment; filename="sygno_export.{item.format}"'
+        },
+    )
+
+
+@app.get("/sygno/subscribe")
+async def subscribe(
+    request: Request,
+    api_key: str = Security(get_read_api_key),
+):
+    """stream newly written climate data as server-sent events"""
+
+    if not reading_feed:
+        raise HTTPException(
+            status_code=501,
+            detail="The reading feed needs a single worker process",
+        )
+    if "aws.event" in request.scope:
+        # Mangum buffers the whole response, the stream would only end at the lambda timeout
+        raise HTTPException(
+            status_code=501,
+            detail="The reading feed needs a long-lived server, it is not available through lambda",
+        )
+    logger.info("new reading feed subscriber")
+    return StreamingResponse(
+        reading_feed.subscribe(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/sygno/metrics")
+async def get_metrics(
+    api_key: str = Security(get_read_api_key),
+):
+    """service metrics"""
+
+    return {
+        "expose_single_flight": expose_flight.metrics(),
+        "expose_cache": expose_cache.metrics(),
+        "reading_feed": reading_feed.metrics() if reading_feed else None,
+        "hot_tier": sygno_api.hot_tier.metrics() if sygno_api.hot_tier else None,
+        "ingest_spool": sygno_api.spool_drainer.metrics() if sygno_api.spool_drainer else None,
+    }
+
+
+mangum_handler = Mangum(app)
+
+
+def is_warmup_event(event) -> bool:
+    """Check for a scheduled warm-up event rather than an API request"""
+
+    if not isinstance(event, dict):
+        return False
+    return bool(event.get("warmup")) or (
+        event.get("source") == "aws.events" and event.get("detail-type") == "Scheduled Event"
+    )
+
+
+def warm_up() -> Dict:
+    """Open the pooled table connections and precompute the common expose answers"""
+
+    started = time.perf_counter()
+    errors = []
+    for table in (sygno_api.get_table(), event_log.get_table()):
+        try:
+            # DescribeTable sets up the TLS connection the first real request would pay for
+            table.load()
+        except ClientError as e:
+            errors.append(e.response["Error"]["Message"])
+        except Exception as e:
+            # connection errors and timeouts must not fail the scheduled invocation
+            errors.append(repr(e))
+
+    primed = []
+    for expose_type in settings.warmup_expose_types:
+        item = ExposeRequest(type=expose_type)
+        try:
+            res = sygno_api.get_data(item)
+        except Exception as e:
+            errors.append(f"{expose_type}: {e!r}")
+            continue
+        if res and expose_type != "latest":
+            # a cached latest would hide writes taken by other containers until the next warm-up
+            expose_cache.set(item.json(sort_keys=True), res, settings.warmup_cache_seconds)
+            primed.append(expose_type)
+
+    readiness = {
+        "status": "ready" if not errors else "degraded",
+        "primed": primed,
+        "errors": errors,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    logger.info(f"warm-up finished: {readiness}")
+    return readiness
+
+
+def handler(event, context):
+    """Lambda handler, answers warm-up events directly and hands everything else to FastAPI"""
+
+    if is_warmup_event(event):
+        return warm_up()
+    return mangum_handler(event, context)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Launches FastAPI service app")
     parser.add_argument("--openapi_fileout", type=pathlib.Path, default=None)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5005)
+    parser.add_argument("--workers", type=int, default=settings.server_workers)
+    parser.add_argument("--graceful_timeout", type=int, default=30,
+                        help="seconds workers get to finish in-flight requests on restart")
+    parser.add_argument("--max_requests", type=int, default=0,
+                        help="recycle each worker after this many requests, 0 never recycles")
 
     args = parser.parse_args()
 
@@ -212,6 +513,43 @@ if __name__ == "__main__":
                 ),
                 fout,
             )
+    elif args.workers > 1:
+        if settings.ingest_mode == "spool":
+            parser.error("the spool ingest mode needs a single worker process")
+        if settings.hot_tier_days:
+            parser.error("the hot tier needs a single worker process, a worker's tier misses the others' writes")
+        from sygno_api.utils.server import MultiWorkerServer
+
+        # a worker's feed would only see the readings written through that worker
+        reading_feed = None
+
+        if not settings.expose_cache_seconds:
+            logger.warning("EXPOSE_CACHE_SECONDS is not set, the workers share no expose answers")
+        # answers computed by one worker are served to all of them from shared memory
+        try:
+            expose_cache = SharedAnswerCache(
+                f"{settings.shared_cache_name}-{args.port}",
+                settings.expose_cache_seconds,
+                settings.shared_cache_slots,
+                settings.shared_cache_slot_bytes,
+            )
+        except RuntimeError as e:
+            parser.error(str(e))
+        # launch service
+        MultiWorkerServer(
+            app,
+            {
+                "bind": f"{args.host}:{args.port}",
+                "workers": args.workers,
+                "worker_class": "sygno_api.utils.server.AutoUvicornWorker",
+                "graceful_timeout": args.graceful_timeout,
+                "max_requests": args.max_requests,
+                "max_requests_jitter": args.max_requests // 10,
+                "preload_app": True,
+                # the master owns the shared block and removes it when it exits
+                "on_exit": lambda server: expose_cache.close(),
+            },
+        ).run()
     else:
         # launch service
-        uvicorn.run(app, host="0.0.0.0", port=5005)
+        uvicorn.run(app, host=args.host, port=args.port)
@@ -1,91 +1,120 @@
 """Functions and classes to support the API"""
 import json
-import pandas as pd
+import threading
 from decimal import Decimal
 from datetime import datetime, timedelta
 from dateutil import parser
-from typing import List, Dict
-from statistics import mean
+from itertools import groupby
+from typing import Iterable, List, Dict, Optional
 
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from fastapi.logger import logger
 from pydantic import BaseSettings
 
+from sygno_api.api.hottier import HotTier
+from sygno_api.api.spool import Spool, SpoolDrainer
 from sygno_api.api.schema import (
     WriteResponse,
     ExposeResponse,
     ExposeRequest,
+    ExportRequest,
     WriteRequest,
     ApiRecord,
     FraudItem,
 )
 from sygno_api.utils import dbmethods as dbutils
+from sygno_api.utils.profiling import span
+from sygno_api.utils.rangefetch import RangeFetcher
 
 today = "2021-05-14"
 now = "2021-05-14T10:34:21+02:00"
-num_of_parameters = 21
+# partition key of the raw readings, written by the write endpoint and read by the expose endpoint
+data_partition = "weather"
+dict_parameters = ["wind_direction_compass", "status_meteo_station", "status_meteo_station_communication"]
+increment = timedelta(minutes=15)
 
 
-def parse_raw_data(item: Dict, api_key: str) -> Dict:
+def parse_raw_data(item: Dict, api_key: str, retention_days: Optional[int] = None) -> Dict:
     """clean raw data before saving to table"""
 
     fraud_parameters = {}
     rows = item.data["rows"][1:]
     for parameter in rows:
         fraud_parameters[parameter[0]] = parameter[1]
-    table_item = ApiRecord(id="action",
+    expires_at = None
+    if retention_days:
+        # readings age out relative to their own timestamp
+        expires_at = int((parser.parse(item.data["ts"]) + timedelta(days=retention_days)).timestamp())
+    table_item = ApiRecord(id=data_partition,
                            sk=item.data["ts"],
                            name=item.data["name"],
                            event_time=item.data["ts"],
                            user_id=api_key,
-                           data=fraud_parameters)
+                           data=fraud_parameters,
+                           expires_at=expires_at)
 
-    return json.loads(json.dumps(table_item.dict()), parse_float=Decimal)
+    return json.loads(json.dumps(table_item.dict(exclude_none=True)), parse_float=Decimal)
 
 
 def parse_raw_into_fraud_schema(item: Dict) -> FraudItem:
     """ clean raw data to return a fraud dict"""
-    fraud_item = FraudItem(name=item["name"], timestamp=item["event_time"], fraud_data=item["data"])
+    with span("pydantic"):
+        fraud_item = FraudItem(name=item["name"], timestamp=item["event_time"], fraud_data=item["data"])
     logger.info(f"parsed item: {fraud_item}")
     return fraud_item
 
 
-def get_15min_increments(items: List) -> Dict:
-    """ cleans list of fraud items into 15min increments"""
-    count = 0
-    results = {}
-    for item in items:
-        if (count == 0) or (count % 3 == 0):
-            results[item["event_time"]] = parse_raw_into_fraud_schema(item)
-            count = count + 1
-        else:
-            count = count + 1
-            continue
-    return results
+def local_time(timestamp: str) -> datetime:
+    """ a timestamp in the utc offset of now, so increments and days follow one clock"""
+    return parser.isoparse(timestamp).astimezone(parser.isoparse(now).tzinfo)
 
 
-def get_averages(items: List) -> Dict:
-    """ cleans list of fraud items into averages"""
-    results = {}
-    dict_parameters = ["wind_direction_compass", "status_meteo_station", "status_meteo_station_communication"]
-    fraud_parameter_list = [[] for i in range(num_of_parameters)]
-    df = pd.DataFrame(columns=list(items[0]["data"].keys()))
+def increment_start(moment: datetime) -> datetime:
+    """ start of the 15 min increment of the clock holding moment"""
+    return moment.replace(minute=moment.minute - moment.minute % 15, second=0, microsecond=0)
 
-    for item in items:
-        for i in range(len(item["data"])):
-            if list(item["data"].keys())[i] in dict_parameters:
-                fraud_parameter_list[i].append(list(item["data"].values())[i]["key"])
-            else:
-                fraud_parameter_list[i].append(list(item["data"].values())[i])
-
-    for column in df:
-        df[column] = fraud_parameter_list[df.columns.get_loc(column)]
-
-    # Iterate over columns using DataFrame.iteritems()
-    for (column_name, column_value) in df.iteritems():
-        results[f"average_{column_name}"] = mean(column_value.values)
-    return results
+
+def day_start(moment: datetime) -> datetime:
+    """ midnight starting the day holding moment"""
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_15min_increments(items: Iterable) -> Dict:
+    """ cleans a stream of fraud items into 15min increments of the clock, newest first.
+    Each increment shows its first reading, so it does not depend on where the queried range starts"""
+    with span("aggregation"):
+        firsts = {}
+        for item in items:
+            moment = local_time(item["sk"])
+            start = increment_start(moment)
+            if start not in firsts or moment < firsts[start][0]:
+                firsts[start] = (moment, item)
+        return {
+            firsts[start][1]["event_time"]: parse_raw_into_fraud_schema(firsts[start][1])
+            for start in sorted(firsts, reverse=True)
+        }
+
+
+def expose_response(description: str, data: Dict, cursor: Optional[str] = None) -> ExposeResponse:
+    """ build a successful expose response"""
+    with span("pydantic"):
+        return ExposeResponse(status=200, description=description, data=data, cursor=cursor)
+
+
+def get_averages(items: Iterable) -> Dict:
+    """ cleans a stream of fraud items into averages"""
+    with span("aggregation"):
+        totals = {}
+        counts = {}
+        for item in items:
+            for parameter, value in item["data"].items():
+                if parameter in dict_parameters:
+                    value = value["key"]
+                totals[parameter] = totals.get(parameter, 0) + value
+                counts[parameter] = counts.get(parameter, 0) + 1
+
+        return {f"average_{parameter}": total / counts[parameter] for parameter, total in totals.items()}
 
 
 def get_1day_increments(items: List) -> Dict:
@@ -108,20 +137,74 @@ class sygnoAPI:
     def __init__(self, settings: BaseSettings):
         """Initialize sygno API object"""
         self.api_table_name = settings.api_table_name
-        self.api_table = dbutils.get_db_table(self.api_table_name)
+        # boto3 resources must stay on the thread that built them, so each thread gets its own table handle
+        self.local = threading.local()
+        self.raw_data_retention_days = settings.raw_data_retention_days
+        self.fetcher = RangeFetcher(
+            self.api_table_name,
+            max_workers=settings.range_fetch_workers,
+            target_items_per_split=settings.range_fetch_target_items,
+        )
+        # optional in-memory tier of the last hot_tier_days of readings
+        self.hot_tier = None
+        if settings.hot_tier_days:
+            self.hot_tier = HotTier(data_partition, settings.hot_tier_days, settings.hot_tier_max_items)
+        # optional asynchronous ingest through a durable local spool
+        self.spool_drainer = None
+        if settings.ingest_mode == "spool":
+            spool = Spool(settings.spool_dir, settings.spool_segment_bytes, settings.spool_segment_seconds)
+            self.spool_drainer = SpoolDrainer(
+                spool,
+                self.api_table_name,
+                workers=settings.spool_drain_workers,
+                rate=settings.spool_drain_rate,
+                batch_size=settings.spool_batch_size,
+            )
 
         logger.info(f"API Table Name: {self.api_table_name}\n")
-        logger.info(f"API Table: {self.api_table}\n")
+        logger.info(f"API Table: {self.get_table()}\n")
         logger.info(f"sygno API package initialized!")
 
+    def get_table(self):
+        """Get the api table handle of the current thread"""
+        if not hasattr(self.local, "table"):
+            self.local.table = dbutils.get_db_table(self.api_table_name)
+        return self.local.table
+
+    def query_range(self, low: str, high: str) -> Iterable[Dict]:
+        """ stream the fraud data between low and high, newest first"""
+        if self.hot_tier:
+            if not self.hot_tier.backfilled:
+                self.backfill_hot_tier(high)
+            items = self.hot_tier.range(low, high)
+            if items is not None:
+                return iter(items)
+        return self.fetcher.fetch(data_partition, low, high, descending=True)
+
+    def backfill_hot_tier(self, high: str):
+        """ lazily load the hot tier window ending at high from the table"""
+        with self.hot_tier.backfill_lock:
+            if self.hot_tier.backfilled:
+                return
+            low = str((parser.parse(high) - timedelta(seconds=self.hot_tier.window)).isoformat())
+            logger.info(f"backfilling hot tier from {low} to {high}")
+            # fetched before taking the tier lock, writes keep adding to the tier during the fetch
+            items = list(self.fetcher.fetch(data_partition, low, high))
+            self.hot_tier.backfill(items, low)
+
     def get_latest(self):
         """ method to query table and get the latest fraud data"""
+        latest = self.hot_tier.latest() if self.hot_tier else None
+        if latest and latest["sk"].startswith(today):
+            return expose_response(description="latest fraud data",
+                                   data={"latest": parse_raw_into_fraud_schema(latest)})
         try:
-            response = self.api_table.query(
-                KeyConditionExpression=Key("id").eq("weather") & Key("sk").begins_with(today),
-                ScanIndexForward=False,
-                Limit=1
-            )
+            with span("dynamodb"):
+                response = self.get_table().query(
+                    KeyConditionExpression=Key("id").eq(data_partition) & Key("sk").begins_with(today),
+                    ScanIndexForward=False,
+                    Limit=1
+                )
             logger.info(f"got {response} for the latest fraud data")
 
         except ClientError as e:
@@ -129,107 +212,123 @@ class sygnoAPI:
             return None
 
         else:
-            return ExposeResponse(status=200, description="latest fraud data",
-                                  data={"latest": parse_raw_into_fraud_schema(response["Items"][0])})
+            return expose_response(description="latest fraud data",
+                                   data={"latest": parse_raw_into_fraud_schema(response["Items"][0])})
 
-    def get_24h_devt(self):
-        """ Expose the development of the fraud parameters over the last 24h in 15 min increments"""
+    def get_24h_devt(self, since: Optional[str] = None):
+        """ Expose the development of the fraud parameters over the last 24h in 15 min increments,
+        only the increments after the since cursor when it is given"""
         try:
-            low = str((parser.parse(now) - timedelta(days=1)).isoformat())
-            response = self.api_table.query(
-                KeyConditionExpression=Key("id").eq("weather") & Key("sk").between(low, now),
-                ScanIndexForward=False,
-            )
-            logger.info(f"got {response} for 24h fraud data")
+            now_time = parser.isoparse(now)
+            low_time = increment_start(now_time) - timedelta(days=1) + increment
+            if since:
+                # an increment's first reading is final once it started, so only later increments change
+                low_time = max(low_time, increment_start(local_time(since)) + increment)
+            items = self.query_range(low_time.isoformat(), now) if low_time <= now_time else iter(())
+            data = get_15min_increments(items)
+            logger.info(f"got {len(data)} increments for 24h fraud data since {since}")
         except ClientError as e:
             logger.info(e.response["Error"]["Message"])
             return None
 
         else:
-            return ExposeResponse(status=200, description="last 24h fraud data in 15 min increments",
-                                  data=get_15min_increments(response["Items"]))
+            # the newest increment is the cursor for the next delta request
+            return expose_response(description="last 24h fraud data in 15 min increments",
+                                   data=data, cursor=next(iter(data), since))
 
     def get_24h_average(self):
         """" Expose the average for each of the fraud parameters for the last 24h"""
         try:
             low = str((parser.parse(now) - timedelta(days=1)).isoformat())
-            response = self.api_table.query(
-                KeyConditionExpression=Key("id").eq("weather") & Key("sk").between(low, now),
-                ScanIndexForward=False,
-            )
-            logger.info(f"got {response} for the latest fraud data")
+            averages = get_averages(self.query_range(low, now))
+            logger.info(f"got {averages} for the 24h fraud data")
         except ClientError as e:
             logger.info(e.response["Error"]["Message"])
             return None
         else:
-            return ExposeResponse(status=200, description="last 24h fraud data averages",
-                                  data={"24h averages": FraudItem(name="24h averages",
-                                                                    timestamp=f"from {low} to {now}",
-                                                                    fraud_data=get_averages(response["Items"]))})
-
-    def get_7d_devt(self):
-        """ Expose the development of the fraud parameters over the last 7 days in 1 day increments
-        (average per day) """
+            return expose_response(description="last 24h fraud data averages",
+                                   data={"24h averages": FraudItem(name="24h averages",
+                                                                     timestamp=f"from {low} to {now}",
+                                                                     fraud_data=averages)})
+
+    def get_7d_devt(self, since: Optional[str] = None):
+        """ Expose the development of the fraud parameters over the last 7 calendar days in 1 day increments
+        (average per day, today so far first), only the days ending after the since cursor when it is given """
         try:
             result = {}
-            high = "2021-05-14T10:34:21+02:00"
-            low = str((parser.parse(high) - timedelta(days=1)).isoformat())
-            for i in range(7):
-                response = self.api_table.query(
-                    KeyConditionExpression=Key("id").eq("weather") & Key("sk").between(low, high),
-                    ScanIndexForward=False,
-                )
-                logger.info(f"got {response} for the 1 day fraud data")
-                result[f"day_{i+1}"] = FraudItem(name="24h averages", timestamp=f"from {low} to {high}",
-                                                   fraud_data=get_averages(response["Items"]))
-                high = low
-                low = str((parser.parse(high) - timedelta(days=1)).isoformat())
+            now_time = parser.isoparse(now)
+            low_time = day_start(now_time) - timedelta(days=6)
+            if since:
+                # the cursor's own day may have gained readings since, earlier days are final
+                low_time = max(low_time, day_start(local_time(since)))
+
+            # one query over every day ending after the cursor, split into days as the items stream in
+            items = self.query_range(low_time.isoformat(), now) if low_time <= now_time else iter(())
+            for day, day_items in groupby(items, key=lambda item: day_start(local_time(item["sk"]))):
+                high = min(day + timedelta(days=1), now_time)
+                key = day.date().isoformat()
+                result[key] = FraudItem(name="24h averages", timestamp=f"from {day.isoformat()} to {high.isoformat()}",
+                                        fraud_data=get_averages(day_items))
+                logger.info(f"got {result[key]} for the 1 day fraud data")
 
         except ClientError as e:
             logger.info(e.response["Error"]["Message"])
             return None
         else:
-            return ExposeResponse(status=200, description="last 7 days fraud data in 1 day increments",
-                                  data=result)
+            return expose_response(description="last 7 days fraud data in 1 day increments",
+                                   data=result, cursor=now)
 
     def get_7d_average(self):
         """ Expose the average of the fraud parameters over the last 7 days """
         try:
             low = str((parser.parse(now) - timedelta(days=7)).isoformat())
-            response = self.api_table.query(
-                KeyConditionExpression=Key("id").eq("weather") & Key("sk").between(low, now),
-                ScanIndexForward=False,
-            )
-            logger.info(f"got {response} for the 7d fraud data")
+            averages = get_averages(self.query_range(low, now))
+            logger.info(f"got {averages} for the 7d fraud data")
         except ClientError as e:
             logger.info(e.response["Error"]["Message"])
             return None
         else:
-            return ExposeResponse(status=200, description="average 7 days fraud data",
-                                  data={"7 day Averages": FraudItem(name="7 day Averages",
-                                                                      timestamp=f"from {low} to {now}",
-                                                                      fraud_data=get_averages(response["Items"]))})
+            return expose_response(description="average 7 days fraud data",
+                                   data={"7 day Averages": FraudItem(name="7 day Averages",
+                                                                       timestamp=f"from {low} to {now}",
+                                                                       fraud_data=averages)})
 
     def get_data(self, item):
         """ check type and call appropriate get method"""
         if item.type == "latest":
             return self.get_latest()
         elif item.type == "24h_devt":
-            return self.get_24h_devt()
+            return self.get_24h_devt(item.since)
         elif item.type == "24h_average":
             return self.get_24h_average()
         elif item.type == "7d_devt":
-            return self.get_7d_devt()
+            return self.get_7d_devt(item.since)
         elif item.type == "7d_average":
             return self.get_7d_average()
         return None
 
+    def get_export_pages(self, item: ExportRequest):
+        """ lazily page through the raw data between the export start and end timestamps"""
+        try:
+            yield from dbutils.query_pages(
+                self.get_table(),
+                KeyConditionExpression=Key("id").eq(data_partition) & Key("sk").between(item.start, item.end),
+                ScanIndexForward=True,
+            )
+        except ClientError as e:
+            logger.info("ERROR when exporting data from Api table")
+            logger.info(e.response["Error"]["Message"])
+            # abort the stream, a truncated body must not look like a complete export
+            raise
+
     def save_raw_data(self, item: Dict, api_key: str) -> WriteResponse:
         """ get and save a new fraud item"""
-        table_item = parse_raw_data(item, api_key)
+        table_item = parse_raw_data(item, api_key, self.raw_data_retention_days)
         try:
-            response = self.api_table.put_item(Item=table_item)
+            response = self.get_table().put_item(Item=table_item)
             logger.info(f"Added new record to api table: {table_item} with {response}")
+            if self.hot_tier:
+                self.hot_tier.add(table_item)
         except ClientError as e:
             logger.info("ERROR when adding new item to Api table")
             logger.info(e.response["Error"]["Message"])
@@ -237,3 +336,18 @@ class sygnoAPI:
         else:
             return WriteResponse(status="200", description=f"Successfully added raw data to database",  data=table_item)
 
+    def spool_raw_data(self, item: Dict, api_key: str) -> WriteResponse:
+        """ accept a new fraud item into the spool, it is written to the table in the background"""
+        table_item = parse_raw_data(item, api_key, self.raw_data_retention_days)
+        try:
+            self.spool_drainer.spool.append(table_item)
+            logger.info(f"Spooled new record for api table: {table_item}")
+            if self.hot_tier:
+                self.hot_tier.add(table_item)
+        except OSError as e:
+            logger.info("ERROR when spooling new item for Api table")
+            logger.info(e)
+            return WriteResponse(status="500", description=f"Failed to spool raw data",  data=table_item)
+        else:
+            return WriteResponse(status="202", description=f"Accepted raw data for writing to database",  data=table_item)
+
@@ -0,0 +1,193 @@
+"""Short-lived caches of computed expose answers"""
+import fcntl
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+from fastapi.logger import logger
+
+from sygno_api.api.schema import ExposeResponse
+
+
+class AnswerCache:
+    """
+    In-process cache of expose responses, entries expire after ttl_seconds.
+    Expired entries are dropped as they are found, and the oldest entries
+    once more than max_entries are cached
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        """Initialize answer cache, a ttl of 0 only caches answers set with their own ttl"""
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: Dict[str, tuple] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[ExposeResponse]:
+        """Get a cached answer that has not expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, answer: ExposeResponse, ttl_seconds: Optional[float] = None):
+        """Cache an answer for ttl_seconds, the cache ttl when omitted"""
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if not ttl_seconds:
+            return
+        now = time.monotonic()
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (now + ttl_seconds, answer)
+            for stale_key in [cached for cached, entry in self.entries.items() if entry[0] < now]:
+                del self.entries[stale_key]
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached answer, e.g. after a write"""
+        with self.lock:
+            self.entries.clear()
+
+    def metrics(self) -> Dict:
+        """Hit counters of the cache"""
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class SharedAnswerCache:
+    """
+    Expose answer cache in a named shared memory block, so every worker
+    process of a multi-worker server reads the answers the others computed.
+    The server master creates the block before forking the workers, holds
+    a lock on the owner byte of the lock file while it runs and removes the
+    block with close when it exits.
+
+    The block is split into fixed size slots addressed by a hash of the key,
+    a newer answer simply replaces whatever occupied its slot. Slots are
+    guarded by byte range locks on a lock file, which work across processes,
+    and by a thread lock, since byte range locks do not exclude threads of
+    the same process
+    """
+
+    header = struct.Struct("<dII")
+
+    def __init__(self, name: str, ttl_seconds: float, slots: int = 64, slot_bytes: int = 262144):
+        """Create the shared block, replacing one left behind by a server that did not exit cleanly.
+        Raises RuntimeError when a running server owns a block of that name"""
+        self.ttl_seconds = ttl_seconds
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        self.lock_file = open(self.lock_path, "a+b")
+        try:
+            # the byte after the slot locks is held by the owning process until it exits, even when killed
+            fcntl.lockf(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slots)
+        except OSError:
+            self.lock_file.close()
+            raise RuntimeError(f"shared answer cache {name} is owned by a running server")
+        size = slots * slot_bytes
+        try:
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            logger.info(f"replacing shared answer cache {name} left behind by a previous server")
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.oversize = 0
+
+    def slot_of(self, key: bytes) -> int:
+        """slot index of a key, stable across processes"""
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") % self.slots
+
+    def get(self, key: str) -> Optional[ExposeResponse]:
+        """Get a cached answer that has not expired"""
+        key_bytes = key.encode()
+        slot = self.slot_of(key_bytes)
+        offset = slot * self.slot_bytes
+        with self.lock:
+            fcntl.lockf(self.lock_file, fcntl.LOCK_SH, 1, slot)
+            try:
+                expires, key_length, value_length = self.header.unpack_from(self.memory.buf, offset)
+                start = offset + self.header.size
+                found = (
+                    expires > time.time()
+                    and key_length == len(key_bytes)
+                    and bytes(self.memory.buf[start:start + key_length]) == key_bytes
+                )
+                if found:
+                    value = bytes(self.memory.buf[start + key_length:start + key_length + value_length])
+            finally:
+                fcntl.lockf(self.lock_file, fcntl.LOCK_UN, 1, slot)
+
+        if not found:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # numbers come back as Decimal, like answers computed from the table
+        return ExposeResponse.parse_obj(json.loads(value, parse_float=Decimal))
+
+    def set(self, key: str, answer: ExposeResponse, ttl_seconds: Optional[float] = None):
+        """Cache an answer for ttl_seconds, the cache ttl when omitted, answers too large for a slot are not cached"""
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if not ttl_seconds:
+            return
+        key_bytes = key.encode()
+        value = answer.json().encode()
+        if self.header.size + len(key_bytes) + len(value) > self.slot_bytes:
+            self.oversize += 1
+            return
+        slot = self.slot_of(key_bytes)
+        offset = slot * self.slot_bytes
+        start = offset + self.header.size
+        with self.lock:
+            fcntl.lockf(self.lock_file, fcntl.LOCK_EX, 1, slot)
+            try:
+                self.memory.buf[start:start + len(key_bytes)] = key_bytes
+                self.memory.buf[start + len(key_bytes):start + len(key_bytes) + len(value)] = value
+                self.header.pack_into(
+                    self.memory.buf, offset, time.time() + ttl_seconds, len(key_bytes), len(value)
+                )
+            finally:
+                fcntl.lockf(self.lock_file, fcntl.LOCK_UN, 1, slot)
+
+    def clear(self):
+        """Expire every cached answer of every worker, e.g. after a write"""
+        with self.lock:
+            for slot in range(self.slots):
+                fcntl.lockf(self.lock_file, fcntl.LOCK_EX, 1, slot)
+                try:
+                    self.header.pack_into(self.memory.buf, slot * self.slot_bytes, 0.0, 0, 0)
+                finally:
+                    fcntl.lockf(self.lock_file, fcntl.LOCK_UN, 1, slot)
+
+    def close(self):
+        """Remove the shared block and its lock file, called by the server master on exit"""
+        self.memory.close()
+        self.memory.unlink()
+        # removed while the owner lock is still held, so no other server can take over the old file
+        os.remove(self.lock_path)
+        self.lock_file.close()
+
+    def metrics(self) -> Dict:
+        """Hit counters of this worker"""
+        return {"slots": self.slots, "hits": self.hits, "misses": self.misses, "oversize": self.oversize}
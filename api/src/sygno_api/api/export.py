@@ -0,0 +1,163 @@
+"""Streaming encoders for bulk exports of raw climate data"""
+import csv
+import io
+import json
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List
+
+from sygno_api.api import dict_parameters
+from sygno_api.utils.dbmethods import decimal_default
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# fields of an exported reading, in the shape of FraudItem, internal fields and the writer's key stay out
+record_columns = ["name", "timestamp"]
+# parameters without a column in the export schema, as a json object
+extra_column = "extra_data"
+
+
+def parquet_available() -> bool:
+    """check whether the optional pyarrow dependency is installed"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def is_number(value) -> bool:
+    """check for a numeric reading"""
+    return isinstance(value, (Decimal, int, float)) and not isinstance(value, bool)
+
+
+def export_record(item: Dict) -> Dict:
+    """map a table item to the exported reading"""
+    return {"name": item.get("name"), "timestamp": item.get("event_time"), "fraud_data": item.get("data") or {}}
+
+
+def export_schema(page: List[Dict]) -> Dict[str, str]:
+    """column types of an export, taken from the parameters of its first page
+
+    Record columns and dict parameters are strings, numeric readings float64 and any
+    other parameter a string. Parameters first seen after the first page go to the
+    extra column, since a streamed csv header or parquet schema cannot grow.
+    """
+    schema = {column: "string" for column in record_columns}
+    for record in page:
+        for parameter, value in record["fraud_data"].items():
+            if parameter in dict_parameters or (value is not None and not is_number(value)):
+                schema[parameter] = "string"
+            else:
+                schema.setdefault(parameter, "float64")
+    schema[extra_column] = "string"
+    return schema
+
+
+def flatten_record(record: Dict, schema: Dict[str, str]) -> Dict:
+    """flatten an exported reading into a single row of the export schema"""
+    row = {column: record[column] for column in record_columns}
+    extra = {}
+    for parameter, value in record["fraud_data"].items():
+        column_type = schema.get(parameter)
+        if column_type and value is None:
+            row[parameter] = None
+        elif column_type == "float64" and is_number(value):
+            row[parameter] = float(value)
+        elif column_type == "string":
+            row[parameter] = value if isinstance(value, str) else json.dumps(value, default=decimal_default)
+        else:
+            extra[parameter] = value
+    row[extra_column] = json.dumps(extra, default=decimal_default) if extra else None
+    return row
+
+
+def export_ndjson(pages: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """encode pages of exported readings as newline delimited json, one reading per line"""
+    for page in pages:
+        if page:
+            yield "".join(json.dumps(record, default=decimal_default) + "\n" for record in page).encode()
+
+
+def export_csv(pages: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """encode pages of exported readings as csv, columns are taken from the first page"""
+    buffer = io.StringIO()
+    writer = None
+    schema = None
+    for page in pages:
+        if not page:
+            continue
+        if writer is None:
+            schema = export_schema(page)
+            writer = csv.DictWriter(buffer, fieldnames=list(schema))
+            writer.writeheader()
+        rows = [flatten_record(record, schema) for record in page]
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back out in chunks"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_parquet(pages: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """encode pages of exported readings as parquet, one row group per query page"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {"float64": pa.float64(), "string": pa.string()}
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+    for page in pages:
+        if not page:
+            continue
+        if writer is None:
+            schema = export_schema(page)
+            arrow_schema = pa.schema([(column, arrow_types[column_type]) for column, column_type in schema.items()])
+            writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), arrow_schema)
+        rows = [flatten_record(record, schema) for record in page]
+        writer.write_table(pa.Table.from_pylist(rows, schema=arrow_schema))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def export_items(pages: Iterable[List[Dict]], export_format: str) -> Iterator[bytes]:
+    """encode query pages in the requested export format"""
+    pages = ([export_record(item) for item in page] for page in pages)
+    if export_format == "csv":
+        return export_csv(pages)
+    elif export_format == "parquet":
+        return export_parquet(pages)
+    return export_ndjson(pages)
@@ -0,0 +1,94 @@
+"""Server-sent events feed of newly written readings"""
+import asyncio
+import json
+from typing import AsyncIterator, Dict, Set
+
+from fastapi.logger import logger
+from starlette.requests import Request
+
+from sygno_api.utils.dbmethods import decimal_default
+
+
+def format_event(event: str, data: Dict, event_id: str = None) -> str:
+    """format one server-sent event"""
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=decimal_default)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscriber:
+    """Bounded queue of events for one connection"""
+
+    def __init__(self, queue_size: int):
+        """Initialize subscriber"""
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def put(self, message: str) -> bool:
+        """Queue an event, dropping the oldest one when the subscriber is lagging"""
+        dropped = False
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            dropped = True
+        self.queue.put_nowait(message)
+        return dropped
+
+
+class ReadingFeed:
+    """
+    Fans readings out to every connected subscriber. Each subscriber has a
+    bounded queue, so a slow consumer loses its oldest events (and is told
+    how many with a lagged event) instead of holding up the others
+    """
+
+    def __init__(self, queue_size: int = 100, heartbeat_seconds: float = 15.0):
+        """Initialize reading feed"""
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.subscribers: Set[Subscriber] = set()
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, event: str, data: Dict, event_id: str = None):
+        """Publish an event to every subscriber, must be called from the event loop"""
+        # format once, every subscriber gets the same message
+        message = format_event(event, data, event_id)
+        self.published += 1
+        for subscriber in self.subscribers:
+            if subscriber.put(message):
+                self.dropped += 1
+
+    async def subscribe(self, request: Request) -> AsyncIterator[str]:
+        """Stream events to one connection until it disconnects"""
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        logger.info(f"feed subscriber connected, {len(self.subscribers)} subscribers")
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+
+                if subscriber.dropped:
+                    yield format_event("lagged", {"dropped": subscriber.dropped})
+                    subscriber.dropped = 0
+                yield message
+        finally:
+            self.subscribers.discard(subscriber)
+            logger.info(f"feed subscriber disconnected, {len(self.subscribers)} subscribers")
+
+    def metrics(self) -> Dict:
+        """Fan-out counters for the feed"""
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
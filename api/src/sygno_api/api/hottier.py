@@ -0,0 +1,117 @@
+"""In-process hot tier of the most recent readings"""
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from dateutil import parser
+
+
+def to_epoch(timestamp: str) -> float:
+    """epoch seconds of an iso timestamp sort key"""
+    return parser.isoparse(timestamp).timestamp()
+
+
+class HotTier:
+    """
+    Keeps the last window_days of readings of one partition in memory, in
+    columns sorted by timestamp, and answers range lookups by bisection.
+
+    The tier only holds every reading from coverage_start on once it has been
+    backfilled, and it only sees new readings written through this process.
+    Lookups reaching further back than coverage_start return None so callers
+    fall through to dynamoDB.
+    """
+
+    def __init__(self, partition: str, window_days: float, max_items: int = 100000):
+        """Initialize hot tier"""
+        self.partition = partition
+        self.window = timedelta(days=window_days).total_seconds()
+        self.max_items = max_items
+        self.timestamps = array("d")
+        self.items: List[Dict] = []
+        self.coverage_start: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.lock = threading.RLock()
+        # held while the backfill window is fetched, so only one fetch runs and writes are not held up by it
+        self.backfill_lock = threading.Lock()
+
+    @property
+    def backfilled(self) -> bool:
+        """whether the tier has been backfilled and can answer lookups"""
+        return self.coverage_start is not None
+
+    def add(self, item: Dict, replace: bool = True):
+        """Add a reading of the tier's partition, replacing a reading with the same sort key unless replace is off"""
+        if item.get("id") != self.partition:
+            return
+        timestamp = to_epoch(item["sk"])
+        with self.lock:
+            index = bisect_left(self.timestamps, timestamp)
+            if index < len(self.items) and self.items[index]["sk"] == item["sk"]:
+                if replace:
+                    self.items[index] = item
+            else:
+                self.timestamps.insert(index, timestamp)
+                self.items.insert(index, item)
+            self.evict()
+
+    def backfill(self, items: Iterable[Dict], low: str):
+        """Load every reading from low on, after which the tier covers lookups from low,
+        or from its oldest reading when the window did not fit in max_items.
+        Readings added while the items were fetched are newer than the fetched copies and kept"""
+        with self.lock:
+            evicted = self.evicted
+            for item in items:
+                self.add(item, replace=False)
+            coverage_start = max(to_epoch(low), self.coverage_start or float("-inf"))
+            if self.evicted != evicted and self.timestamps:
+                # readings of the window were dropped, the tier only holds them from its oldest on
+                coverage_start = max(coverage_start, self.timestamps[0])
+            self.coverage_start = coverage_start
+
+    def evict(self):
+        """Drop readings older than the window, or beyond max_items, and move coverage up"""
+        if not self.timestamps:
+            return
+        cutoff = bisect_left(self.timestamps, self.timestamps[-1] - self.window)
+        cutoff = max(cutoff, len(self.timestamps) - self.max_items)
+        if cutoff <= 0:
+            return
+        del self.timestamps[:cutoff]
+        del self.items[:cutoff]
+        self.evicted += cutoff
+        if self.coverage_start is not None:
+            self.coverage_start = max(self.coverage_start, self.timestamps[0])
+
+    def range(self, low: str, high: str) -> Optional[List[Dict]]:
+        """Readings between low and high inclusive, newest first, or None when not covered"""
+        low_time, high_time = to_epoch(low), to_epoch(high)
+        with self.lock:
+            if self.coverage_start is None or low_time < self.coverage_start:
+                self.misses += 1
+                return None
+            self.hits += 1
+            start = bisect_left(self.timestamps, low_time)
+            end = bisect_right(self.timestamps, high_time)
+            return self.items[start:end][::-1]
+
+    def latest(self) -> Optional[Dict]:
+        """The newest reading, or None when the tier is not backfilled"""
+        with self.lock:
+            if self.coverage_start is None or not self.items:
+                return None
+            return self.items[-1]
+
+    def metrics(self) -> Dict:
+        """Size and hit counters of the hot tier"""
+        return {
+            "items": len(self.items),
+            "coverage_start": self.coverage_start,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
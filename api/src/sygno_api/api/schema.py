@@ -1,12 +1,61 @@
 """Schema for API payloads and inputs"""
+from datetime import datetime
 from typing import Dict, Optional
-from pydantic import BaseModel, Field
+from dateutil import parser
+from pydantic import BaseModel, Field, validator
+
+
+def parse_timestamp(value: str, field: str) -> datetime:
+    """parse an ISO 8601 timestamp with a utc offset, like the table sort keys"""
+    try:
+        moment = parser.isoparse(value)
+    except ValueError:
+        raise ValueError(f"{field} must be an ISO 8601 timestamp")
+    if moment.tzinfo is None:
+        raise ValueError(f"{field} must include a utc offset")
+    return moment
 
 
 class ExposeRequest(BaseModel):
     """Schema for expose request"""
     type: str = Field(..., description="The type of data to expose: latest | 24h_devt "
                                        "| 24_average | 7d_devt | 7d_average")
+    since: Optional[str] = Field(None, description="Cursor from a previous 24h_devt or 7d_devt response, "
+                                                   "only the increments after it are returned")
+
+    @validator("since")
+    def since_is_timestamp(cls, since):
+        """cursors are ISO 8601 timestamps with a utc offset, like the table sort keys"""
+        if since is not None:
+            parse_timestamp(since, "since")
+        return since
+
+
+class ExportRequest(BaseModel):
+    """Schema for export request"""
+    start: str = Field(..., description="Timestamp of the first reading to export")
+    end: str = Field(..., description="Timestamp of the last reading to export")
+    format: str = Field("ndjson", description="The export format: ndjson | csv | parquet")
+
+    @validator("start")
+    def start_is_timestamp(cls, start):
+        """the range is queried on the table sort keys"""
+        parse_timestamp(start, "start")
+        return start
+
+    @validator("end")
+    def end_is_after_start(cls, end, values):
+        """a reversed range is rejected here, dynamoDB would only reject it once the export is streaming"""
+        end_moment = parse_timestamp(end, "end")
+        start = values.get("start")
+        if start is None:
+            return end
+        if parser.isoparse(start) > end_moment:
+            raise ValueError("start must not be after end")
+        if start > end:
+            # sort keys compare as strings, so the offsets must match for the range to hold
+            raise ValueError("start and end must use the same utc offset")
+        return end
 
 
 class FraudItem(BaseModel):
@@ -21,6 +70,7 @@ class ExposeResponse(BaseModel):
     status: str
     description: str
     data: Dict[str, FraudItem]
+    cursor: Optional[str]
 
 
 class WriteRequest(BaseModel):
@@ -43,4 +93,5 @@ class ApiRecord(BaseModel):
     name: str
     user_id: Optional[str]
     data: Optional[Dict]
+    expires_at: Optional[int]
 
@@ -0,0 +1,50 @@
+"""Single-flight deduplication of identical concurrent requests"""
+import asyncio
+from typing import Callable, Dict, Hashable
+
+from starlette.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    """
+    Runs one computation per key at a time, concurrent callers
+    with the same key share its result instead of recomputing it
+    """
+
+    def __init__(self):
+        """Initialize single-flight group"""
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.executions = 0
+
+    async def do(self, key: Hashable, fn: Callable, *args):
+        """Run fn(*args) in the threadpool, or join the in-flight run for the same key"""
+        self.calls += 1
+        future = self.in_flight.get(key)
+        if future is None:
+            self.executions += 1
+            future = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+
+        # shield the shared run so one disconnecting caller does not cancel it for the rest
+        return await asyncio.shield(future)
+
+    def _finish(self, key: Hashable, future: asyncio.Future):
+        """Forget a finished run so the next caller computes a fresh result"""
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+        if not future.cancelled():
+            # mark the exception retrieved in case every caller went away
+            future.exception()
+
+    def metrics(self) -> Dict:
+        """Coalescing counters for this single-flight group"""
+        coalesced = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": coalesced,
+            "coalescing_ratio": coalesced / self.calls if self.calls else 0.0,
+            "in_flight": len(self.in_flight),
+        }
@@ -0,0 +1,243 @@
+"""Durable local spool for asynchronous ingest of raw data"""
+import glob
+import json
+import os
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from botocore.exceptions import ClientError
+from fastapi.logger import logger
+
+from sygno_api.utils import dbmethods as dbutils
+
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".ndjson"
+
+
+def count_lines(path: str) -> int:
+    """number of spooled items in a segment file"""
+    with open(path, "rb") as fin:
+        return sum(1 for _ in fin)
+
+
+class Spool:
+    """
+    Append-only segment files of table items waiting to be written.
+    Items are fsynced before append returns; the active segment is sealed
+    once it is large or old enough, and sealed segments are handed to
+    drainers oldest first
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 1000000, segment_seconds: float = 5.0):
+        """Initialize spool, recovering the segments left by a previous process"""
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.lock = threading.Lock()
+        self.active = None
+        self.active_path = None
+        self.active_opened = 0.0
+        self.claimed = set()
+        os.makedirs(directory, exist_ok=True)
+
+        # segments still open when a previous process stopped are drained like sealed ones
+        for path in glob.glob(os.path.join(directory, f"*{OPEN_SUFFIX}")):
+            os.replace(path, path[: -len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+        sealed = self.sealed_segments()
+        self.depth = sum(count_lines(path) for path in sealed)
+        self.sequence = max((int(os.path.basename(path).split("-")[1].split(".")[0]) for path in sealed), default=0)
+        logger.info(f"Spool at {directory} recovered {len(sealed)} segments with {self.depth} items")
+
+    def sealed_segments(self) -> List[str]:
+        """sealed segment paths, oldest first"""
+        return sorted(glob.glob(os.path.join(self.directory, f"segment-*{SEALED_SUFFIX}")))
+
+    def append(self, item: Dict):
+        """Durably append one table item"""
+        line = (json.dumps(item, default=dbutils.decimal_default) + "\n").encode()
+        with self.lock:
+            if self.active is None:
+                self.sequence += 1
+                self.active_path = os.path.join(self.directory, f"segment-{self.sequence:012d}{OPEN_SUFFIX}")
+                self.active = open(self.active_path, "ab")
+                self.active_opened = time.monotonic()
+            self.active.write(line)
+            self.active.flush()
+            os.fsync(self.active.fileno())
+            self.depth += 1
+            if self.active.tell() >= self.segment_bytes:
+                self.seal()
+
+    def seal(self):
+        """Close the active segment so it can be drained, the lock must be held"""
+        if self.active is None:
+            return
+        self.active.close()
+        os.replace(self.active_path, self.active_path[: -len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+        self.active = None
+        self.active_path = None
+
+    def claim(self) -> Optional[str]:
+        """Claim the oldest sealed segment for draining, sealing an idle active segment first"""
+        with self.lock:
+            if self.active is not None and time.monotonic() - self.active_opened >= self.segment_seconds:
+                self.seal()
+            for path in self.sealed_segments():
+                if path not in self.claimed:
+                    self.claimed.add(path)
+                    return path
+        return None
+
+    def complete(self, path: str, item_count: int):
+        """Remove a segment once every item in it has been written"""
+        with self.lock:
+            os.remove(path)
+            self.claimed.discard(path)
+            self.depth -= item_count
+
+    def release(self, path: str):
+        """Hand a segment back after a failed drain so it is retried"""
+        with self.lock:
+            self.claimed.discard(path)
+
+    def close(self):
+        """Seal the active segment"""
+        with self.lock:
+            self.seal()
+
+    def metrics(self) -> Dict:
+        """Depth of the spool"""
+        return {
+            "depth": self.depth,
+            "segments": len(self.sealed_segments()) + (1 if self.active is not None else 0),
+        }
+
+
+class RateLimiter:
+    """Spaces out work to a target rate of items per second, shared between threads"""
+
+    def __init__(self, rate: float):
+        """Initialize rate limiter"""
+        self.rate = rate
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count: int):
+        """Block until count items may be processed"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + count / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+class SpoolDrainer:
+    """Background workers that flush sealed spool segments to the table in batches"""
+
+    def __init__(
+        self,
+        spool: Spool,
+        table_name: str,
+        workers: int = 1,
+        rate: float = 25.0,
+        batch_size: int = 25,
+        poll_seconds: float = 1.0,
+    ):
+        """Initialize spool drainer"""
+        self.spool = spool
+        self.table_name = table_name
+        self.local = threading.local()
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.stopped = threading.Event()
+        self.threads = []
+        self.drained = 0
+        self.failures = 0
+        self.last_error = None
+
+    def get_table(self):
+        """Get the table handle of the current drainer thread"""
+        if not hasattr(self.local, "table"):
+            self.local.table = dbutils.get_db_table(self.table_name)
+        return self.local.table
+
+    def start(self):
+        """Start the drainer threads"""
+        self.stopped.clear()
+        self.threads = [
+            threading.Thread(target=self.run, name=f"spool-drainer-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """Stop the drainer threads, unfinished segments stay spooled"""
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+        self.spool.close()
+
+    def run(self):
+        """Drain segments until stopped, backing off while the table or the spool is failing"""
+        backoff = self.poll_seconds
+        while not self.stopped.is_set():
+            path = None
+            try:
+                path = self.spool.claim()
+                if path is None:
+                    self.stopped.wait(self.poll_seconds)
+                    continue
+                item_count = self.drain_segment(path)
+                self.spool.complete(path, item_count)
+            except Exception as e:
+                # outages raise ClientError or BotoCoreError (connection errors, timeouts), and the
+                # drainer must outlive them and any other failure, or the spool only ever grows
+                message = e.response["Error"]["Message"] if isinstance(e, ClientError) else repr(e)
+                logger.info(f"ERROR when draining spool segment {path}")
+                logger.info(message)
+                self.failures += 1
+                self.last_error = message
+                if path is not None:
+                    self.spool.release(path)
+                self.stopped.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+            else:
+                self.drained += item_count
+                backoff = self.poll_seconds
+
+    def drain_segment(self, path: str) -> int:
+        """Write every item of a segment to the table, returns the number of lines drained"""
+        with open(path, encoding="utf-8") as fin:
+            lines = fin.read().splitlines()
+        items = []
+        for line in lines:
+            try:
+                items.append(json.loads(line, parse_float=Decimal))
+            except ValueError:
+                # a torn last line from a crash mid-append
+                logger.info(f"skipping unreadable spooled item in {path}")
+
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            self.limiter.acquire(len(batch))
+            with self.get_table().batch_writer(overwrite_by_pkeys=["id", "sk"]) as writer:
+                for item in batch:
+                    writer.put_item(Item=item)
+        logger.info(f"drained {len(items)} items from spool segment {path}")
+        return len(lines)
+
+    def metrics(self) -> Dict:
+        """Spool depth, drain counters and live drainer threads"""
+        return {
+            **self.spool.metrics(),
+            "drained": self.drained,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "alive_workers": sum(thread.is_alive() for thread in self.threads),
+        }
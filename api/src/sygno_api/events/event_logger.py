@@ -1,9 +1,11 @@
 """Event logging for the API service"""
 import logging
-from datetime import datetime, timezone
-from botocore.exceptions import ClientError
+import threading
+from datetime import datetime, timedelta, timezone
+from botocore.exceptions import BotoCoreError, ClientError
 from pydantic import BaseSettings
 from sygno_api.api.schema import ApiRecord
+from sygno_api.utils import cfnutils
 from sygno_api.utils import dbmethods as dbutils
 
 logger = logging.getLogger(__name__)
@@ -21,6 +23,11 @@ def add_to_events_table(new_item, event_table):
         logger.error(e.response["Error"]["Message"])
         return None
 
+    except BotoCoreError as e:
+        # an unreachable table must not fail the request being logged
+        logger.error(f"could not reach the events table: {e}")
+        return None
+
 
 class EventLogger:
     """
@@ -36,8 +43,35 @@ class EventLogger:
             f"event table name: {settings.events_table_name}, app version: {settings.app_version}"
         )
         self.events_table_name = settings.events_table_name
-        self.events_table = dbutils.get_db_table(self.events_table_name)
+        self.stack_name = settings.stack_name
+        self.events_table_output_key = settings.events_table_output_key
+        # boto3 resources must stay on the thread that built them, so each thread gets its own table handle
+        self.local = threading.local()
         self.app_version = settings.app_version
+        self.event_retention_days = settings.event_retention_days
+        self.default_event_retention_days = settings.default_event_retention_days
+
+    def get_table_name(self):
+        """Get the events table name, looked up in the stack outputs when it is not configured"""
+        if self.events_table_name is None:
+            output = cfnutils.get_stack_cfn_output_value(self.stack_name, self.events_table_output_key)
+            self.events_table_name = output["OutputValue"]
+            logger.info(f"found events table {self.events_table_name} in the {self.stack_name} stack outputs")
+        return self.events_table_name
+
+    def get_table(self):
+        """Get the events table handle of the current thread"""
+        if not hasattr(self.local, "table"):
+            self.local.table = dbutils.get_db_table(self.get_table_name())
+        return self.local.table
+
+    def get_expiry(self, name, event_time):
+        """Get the ttl epoch seconds for an event type, None keeps the event forever"""
+
+        retention_days = self.event_retention_days.get(name, self.default_event_retention_days)
+        if not retention_days:
+            return None
+        return int((event_time + timedelta(days=retention_days)).timestamp())
 
     def log(self, api_key, name, event_data={}):
         """Log event to the event table"""
@@ -50,9 +84,16 @@ class EventLogger:
                           name=name,
                           event_time=f"{current_time_zone}",
                           user_id=api_key,
-                          data=event_data)
+                          data=event_data,
+                          expires_at=self.get_expiry(name, current_time_zone))
 
         # add to events table
-        item = event.dict(by_alias=True)
+        item = event.dict(by_alias=True, exclude_none=True)
         logger.info(f"Logging new event to Api events table, {item}")
-        add_to_events_table(item, self.events_table)
+        try:
+            table = self.get_table()
+        except (ClientError, BotoCoreError) as e:
+            # the stack outputs could not be read, the request being logged must not fail
+            logger.error(f"could not find the events table: {e}")
+            return
+        add_to_events_table(item, table)
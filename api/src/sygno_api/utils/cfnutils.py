@@ -1,5 +1,5 @@
 """Utilities for querying Cloudformation stacks"""
-import boto3
+from sygno_api.utils import clients
 
 
 def filter_cfn_outputs(outputs, export_name: str):
@@ -39,7 +39,7 @@ def get_stack_cfn_output_value(stack_name: str, export_name: str, cf_client=None
     """
 
     if not cf_client:
-        cf_client = boto3.client("cloudformation")
+        cf_client = clients.get_manager().client("cloudformation")
     response = cf_client.describe_stacks(StackName=stack_name)
     return filter_cfn_outputs(
         outputs=response["Stacks"][0]["Outputs"], export_name=export_name
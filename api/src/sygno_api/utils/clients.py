@@ -0,0 +1,128 @@
+"""Shared, tuned AWS session and clients for the process"""
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+import boto3
+from botocore.config import Config
+from pydantic import BaseSettings
+
+logger = logging.getLogger(__name__)
+
+
+class ClientSettings(BaseSettings):
+    """AWS client settings, read from environment variables like the service settings"""
+
+    # shared AWS session: region, local stand-in endpoint, connection pool, timeouts and retries
+    aws_region: str = "us-west-1"
+    aws_endpoint_url: Optional[str] = None
+    aws_max_pool_connections: int = 50
+    aws_connect_timeout: float = 2
+    aws_read_timeout: float = 5
+    aws_max_attempts: int = 5
+    aws_retry_mode: str = "adaptive"
+    aws_tcp_keepalive: bool = True
+
+
+class ClientManager:
+    """
+    Owns the one configured boto3 session of the process and the clients
+    and resources built on it, so every caller shares the same connection
+    pools, timeouts and retry behaviour.
+
+    Clients are thread safe and shared by every thread. Resources are not,
+    so each thread gets its own, and table handles built on one should stay
+    in the thread that got them.
+    """
+
+    def __init__(
+        self,
+        region: str = "us-west-1",
+        endpoint_url: Optional[str] = None,
+        max_pool_connections: int = 50,
+        connect_timeout: float = 2,
+        read_timeout: float = 5,
+        max_attempts: int = 5,
+        retry_mode: str = "adaptive",
+        tcp_keepalive: bool = True,
+    ):
+        """Initialize client manager"""
+        self.region = region
+        self.endpoint_url = endpoint_url
+        self.config = Config(
+            region_name=region,
+            max_pool_connections=max_pool_connections,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retries={"max_attempts": max_attempts, "mode": retry_mode},
+            tcp_keepalive=tcp_keepalive,
+        )
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop the session, clients and resources, they are rebuilt on next use"""
+        self.pid = os.getpid()
+        self.session = None
+        self.clients: Dict[str, object] = {}
+        self.local = threading.local()
+
+    def get_session(self) -> boto3.session.Session:
+        """Get the process session, a forked child builds its own instead of sharing sockets"""
+        if self.pid != os.getpid():
+            self.reset()
+        if self.session is None:
+            self.session = boto3.session.Session(region_name=self.region)
+        return self.session
+
+    def client(self, service_name: str):
+        """Get the shared client for a service"""
+        with self.lock:
+            session = self.get_session()
+            if service_name not in self.clients:
+                self.clients[service_name] = session.client(
+                    service_name, config=self.config, endpoint_url=self.endpoint_url
+                )
+            return self.clients[service_name]
+
+    def resource(self, service_name: str):
+        """Get the calling thread's resource for a service"""
+        with self.lock:
+            session = self.get_session()
+            resources = getattr(self.local, "resources", None)
+            if resources is None:
+                resources = self.local.resources = {}
+            if service_name not in resources:
+                resources[service_name] = session.resource(
+                    service_name, config=self.config, endpoint_url=self.endpoint_url
+                )
+            return resources[service_name]
+
+
+_manager: Optional[ClientManager] = None
+
+
+def configure(settings: BaseSettings) -> ClientManager:
+    """Build the process client manager from the service settings"""
+    global _manager
+    _manager = ClientManager(
+        region=settings.aws_region,
+        endpoint_url=settings.aws_endpoint_url,
+        max_pool_connections=settings.aws_max_pool_connections,
+        connect_timeout=settings.aws_connect_timeout,
+        read_timeout=settings.aws_read_timeout,
+        max_attempts=settings.aws_max_attempts,
+        retry_mode=settings.aws_retry_mode,
+        tcp_keepalive=settings.aws_tcp_keepalive,
+    )
+    logger.info(f"Configured AWS clients for {settings.aws_region}, endpoint: {settings.aws_endpoint_url}")
+    return _manager
+
+
+def get_manager() -> ClientManager:
+    """Get the process client manager, with default settings when it was never configured"""
+    global _manager
+    if _manager is None:
+        _manager = ClientManager()
+    return _manager
@@ -1,16 +1,23 @@
 """DynamoDB utility methods"""
 
+import copy
+import json
 import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
 
-import boto3
 from botocore.exceptions import ClientError
 
-dynamodb = boto3.resource("dynamodb", "us-west-1")
+from sygno_api.utils import clients
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def get_db_table(table_name: str) -> dynamodb.Table:
+def get_db_table(table_name: str):
     """Get API table
     Parameters
     ----------
@@ -22,8 +29,215 @@ def get_db_table(table_name: str) -> dynamodb.Table:
         dynamoDB table with matching table name
     """
     try:
-        table = dynamodb.Table(table_name)
+        table = clients.get_manager().resource("dynamodb").Table(table_name)
     except ClientError as e:
         logger.error(e.response["Error"]["Message"])
     else:
         return table
+
+
+def query_pages(table, **query_kwargs):
+    """Lazily page through a dynamoDB query
+    Parameters
+    ----------
+    table:
+        dynamoDB table to query
+    query_kwargs:
+        keyword arguments passed to ``table.query``
+    Yields
+    ------
+    list
+        items of one query page, in the order returned by dynamoDB
+    """
+    while True:
+        response = table.query(**query_kwargs)
+        yield response["Items"]
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        query_kwargs["ExclusiveStartKey"] = last_key
+
+
+def decimal_default(value):
+    """json.dumps default hook for the Decimal values returned by dynamoDB"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _checkpoint_path(checkpoint_dir: str, table_name: str, job_id: str, segment: int, total_segments: int) -> str:
+    # jobs sharing a checkpoint directory must not resume from each other's progress
+    return os.path.join(checkpoint_dir, f"{table_name}-{job_id}-segment-{segment}-of-{total_segments}.json")
+
+
+def load_checkpoint(
+    checkpoint_dir: str, table_name: str, job_id: str, segment: int, total_segments: int
+) -> Optional[Dict]:
+    """Load the saved progress of a scan segment of a job, if any"""
+    path = _checkpoint_path(checkpoint_dir, table_name, job_id, segment, total_segments)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as fin:
+        return json.load(fin, parse_float=Decimal)
+
+
+def save_checkpoint(
+    checkpoint_dir: str, table_name: str, job_id: str, segment: int, total_segments: int, checkpoint: Dict
+):
+    """Atomically save the progress of a scan segment of a job"""
+    path = _checkpoint_path(checkpoint_dir, table_name, job_id, segment, total_segments)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as fout:
+        json.dump(checkpoint, fout, default=decimal_default)
+    os.replace(f"{path}.tmp", path)
+
+
+def scan_segment(
+    table_name: str,
+    segment: int,
+    total_segments: int,
+    transform: Optional[Callable] = None,
+    reduce: Optional[Callable] = None,
+    initial=None,
+    checkpoint_dir: Optional[str] = None,
+    read_capacity: Optional[float] = None,
+    job_id: str = "scan",
+    **scan_kwargs,
+):
+    """Scan one segment of a dynamoDB table
+    Parameters
+    ----------
+    table_name: str
+        dynamoDB table name we are scanning
+    segment: int
+        segment handled by this worker
+    total_segments: int
+        number of segments the table scan is split into
+    transform: callable
+        applied to every scanned item, the item itself is used when omitted
+    reduce: callable
+        folds transformed items into the accumulator, counts items when omitted
+    initial:
+        initial accumulator value, 0 when omitted
+    checkpoint_dir: str
+        directory to save per segment progress to, a finished or interrupted
+        segment is resumed from its checkpoint
+    read_capacity: float
+        read capacity units per second this segment may consume
+    job_id: str
+        name of the job, checkpoints are kept per table and job
+    scan_kwargs:
+        extra keyword arguments passed to ``table.scan``
+    Returns
+    -------
+    object
+        the segment accumulator
+    """
+    accumulator = 0 if initial is None else copy.deepcopy(initial)
+    scan_kwargs.update(Segment=segment, TotalSegments=total_segments)
+    if read_capacity:
+        scan_kwargs["ReturnConsumedCapacity"] = "TOTAL"
+
+    if checkpoint_dir:
+        checkpoint = load_checkpoint(checkpoint_dir, table_name, job_id, segment, total_segments)
+        if checkpoint:
+            accumulator = checkpoint["accumulator"]
+            if checkpoint["done"]:
+                logger.info(f"segment {segment}/{total_segments} already done, skipping")
+                return accumulator
+            scan_kwargs["ExclusiveStartKey"] = checkpoint["last_key"]
+            logger.info(f"resuming segment {segment}/{total_segments} from {checkpoint['last_key']}")
+
+    table = get_db_table(table_name)
+    started = time.monotonic()
+    consumed = 0.0
+    while True:
+        try:
+            response = table.scan(**scan_kwargs)
+        except ClientError as e:
+            logger.error(e.response["Error"]["Message"])
+            raise
+
+        for item in response["Items"]:
+            value = transform(item) if transform else item
+            accumulator = reduce(accumulator, value) if reduce else accumulator + 1
+
+        last_key = response.get("LastEvaluatedKey")
+        if checkpoint_dir:
+            save_checkpoint(
+                checkpoint_dir,
+                table_name,
+                job_id,
+                segment,
+                total_segments,
+                {"last_key": last_key, "accumulator": accumulator, "done": not last_key},
+            )
+        if not last_key:
+            return accumulator
+        scan_kwargs["ExclusiveStartKey"] = last_key
+
+        if read_capacity:
+            # sleep until the consumed capacity is back under the target rate
+            consumed += response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+            delay = consumed / read_capacity - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+
+def parallel_scan(
+    table_name: str,
+    total_segments: int = 4,
+    transform: Optional[Callable] = None,
+    reduce: Optional[Callable] = None,
+    initial=None,
+    use_processes: bool = False,
+    checkpoint_dir: Optional[str] = None,
+    read_capacity: Optional[float] = None,
+    job_id: str = "scan",
+    **scan_kwargs,
+) -> List:
+    """Scan a whole dynamoDB table with one worker per Segment
+    Parameters
+    ----------
+    table_name: str
+        dynamoDB table name we are scanning
+    total_segments: int
+        number of segments, and of concurrent workers
+    transform, reduce, initial:
+        per item transform and reduce, see ``scan_segment``. They must be
+        picklable, e.g. module level functions, when ``use_processes`` is set
+    use_processes: bool
+        run the workers in a process pool instead of a thread pool
+    checkpoint_dir: str
+        directory to save per segment progress to, so the job can be resumed
+    read_capacity: float
+        read capacity units per second the whole scan may consume
+    job_id: str
+        name of the job, so different jobs can share a checkpoint directory
+    Returns
+    -------
+    list
+        the accumulator of every segment, in segment order
+    """
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    segment_capacity = read_capacity / total_segments if read_capacity else None
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=total_segments) as executor:
+        futures = [
+            executor.submit(
+                scan_segment,
+                table_name,
+                segment,
+                total_segments,
+                transform,
+                reduce,
+                initial,
+                checkpoint_dir,
+                segment_capacity,
+                job_id,
+                **scan_kwargs,
+            )
+            for segment in range(total_segments)
+        ]
+        return [future.result() for future in futures]
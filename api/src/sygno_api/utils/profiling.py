@@ -0,0 +1,122 @@
+"""Opt-in per-request profiling and stage spans"""
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+# innermost open span of the current request, nested spans are taken out of their parent's time
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class _NullSpan:
+    """Span used when the current request is not profiled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+class _Span:
+    """Times one stage of a profiled request, without the stages nested in it"""
+
+    def __init__(self, profile, name: str):
+        self.profile = profile
+        self.name = name
+        self.nested = 0.0
+
+    def __enter__(self):
+        self.token = _current_span.set(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        _current_span.reset(self.token)
+        parent = _current_span.get()
+        if parent is not None:
+            parent.nested += elapsed
+        self.profile.add_span(self.name, elapsed - self.nested)
+        return False
+
+
+def span(name: str):
+    """Time a stage of the current request, a shared no-op when it is not profiled"""
+    profile = _current_profile.get()
+    if profile is None:
+        return _null_span
+    return _Span(profile, name)
+
+
+class RequestProfile:
+    """cProfile capture and span breakdown of a single request"""
+
+    def __init__(self, path: str):
+        """Initialize request profile"""
+        self.profile_id = uuid.uuid4().hex
+        self.path = path
+        self.spans: Dict[str, Dict] = {}
+        self.profiler: Optional[cProfile.Profile] = None
+        self.lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float):
+        """Add the duration of a stage, repeated stages are summed"""
+        with self.lock:
+            stage = self.spans.setdefault(name, {"seconds": 0.0, "count": 0})
+            stage["seconds"] += seconds
+            stage["count"] += 1
+
+    def span(self, name: str) -> _Span:
+        """Time a stage of this request outside of run, e.g. on the event loop"""
+        return _Span(self, name)
+
+    def run(self, fn: Callable, *args):
+        """Run fn(*args) in the current thread under cProfile, collecting its spans"""
+        token = _current_profile.set(self)
+        self.profiler = cProfile.Profile()
+        started = time.perf_counter()
+        self.profiler.enable()
+        try:
+            return fn(*args)
+        finally:
+            self.profiler.disable()
+            self.add_span(fn.__name__, time.perf_counter() - started)
+            _current_profile.reset(token)
+
+    def server_timing(self) -> str:
+        """Spans formatted as a Server-Timing header value"""
+        return ", ".join(
+            f"{name};dur={stage['seconds'] * 1000:.2f}" for name, stage in self.spans.items()
+        )
+
+    def stats_text(self, limit: int = 30) -> str:
+        """Top cumulative-time functions of the cProfile capture"""
+        if self.profiler is None:
+            return ""
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+    def dump(self, directory: str):
+        """Write the span breakdown and cProfile stats to a directory"""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{int(time.time())}-{self.profile_id}")
+        with open(f"{base}.json", "w", encoding="utf-8") as fout:
+            json.dump({"path": self.path, "spans": self.spans}, fout, indent=2)
+        if self.profiler is not None:
+            self.profiler.dump_stats(f"{base}.prof")
+        logger.info(f"wrote request profile {base}")
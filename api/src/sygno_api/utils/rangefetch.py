@@ -0,0 +1,121 @@
+"""Concurrent sub-range fetching of long dynamoDB sort key ranges"""
+import logging
+import math
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from boto3.dynamodb.conditions import Key
+from dateutil import parser
+
+from sygno_api.utils import dbmethods as dbutils
+from sygno_api.utils.profiling import span
+
+logger = logging.getLogger(__name__)
+
+
+class RangeFetcher:
+    """
+    Splits a between(low, high) timestamp range into sub-ranges, queries
+    them concurrently and streams the merged items back in sort key order
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        max_workers: int = 4,
+        target_items_per_split: int = 1000,
+        max_splits: int = 32,
+    ):
+        """Initialize range fetcher"""
+        self.table_name = table_name
+        self.max_workers = max_workers
+        self.target_items_per_split = target_items_per_split
+        self.max_splits = max_splits
+        # observed items per second of sort key range, None until the first fetch
+        self.density = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="range-fetch")
+
+    def get_table(self):
+        """Get the table handle of the current worker thread"""
+        if not hasattr(self.local, "table"):
+            self.local.table = dbutils.get_db_table(self.table_name)
+        return self.local.table
+
+    def split_count(self, seconds: float) -> int:
+        """Number of sub-ranges for a range, sized from the observed item density"""
+        if self.density is None:
+            return self.max_workers
+        expected_items = self.density * seconds
+        return max(1, min(self.max_splits, math.ceil(expected_items / self.target_items_per_split)))
+
+    def split_range(self, low: str, high: str) -> List[Tuple[str, str]]:
+        """Split a timestamp range into contiguous sub-ranges sharing their bounds"""
+        low_time, high_time = parser.parse(low), parser.parse(high)
+        seconds = (high_time - low_time).total_seconds()
+        splits = self.split_count(seconds)
+        step = timedelta(seconds=max(1, int(seconds // splits))) if splits > 1 else None
+        if step is None or seconds <= 0:
+            return [(low, high)]
+
+        bounds = [low]
+        bound_time = low_time + step
+        while bound_time < high_time and len(bounds) < splits:
+            bounds.append(bound_time.isoformat())
+            bound_time += step
+        bounds.append(high)
+        return list(zip(bounds, bounds[1:]))
+
+    def observe(self, item_count: int, low: str, high: str):
+        """Update the item density estimate from a fetched sub-range"""
+        seconds = (parser.parse(high) - parser.parse(low)).total_seconds()
+        if seconds <= 0:
+            return
+        observed = item_count / seconds
+        with self.lock:
+            self.density = observed if self.density is None else 0.7 * self.density + 0.3 * observed
+
+    def fetch_range(self, partition: str, low: str, high: str, include_high: bool, descending: bool) -> List[Dict]:
+        """Fetch every page of one sub-range"""
+        items = []
+        for page in dbutils.query_pages(
+            self.get_table(),
+            KeyConditionExpression=Key("id").eq(partition) & Key("sk").between(low, high),
+            ScanIndexForward=not descending,
+        ):
+            items.extend(page)
+        self.observe(len(items), low, high)
+        if not include_high:
+            # the shared bound belongs to the next sub-range
+            items = [item for item in items if item["sk"] != high]
+        return items
+
+    def fetch(self, partition: str, low: str, high: str, descending: bool = False) -> Iterator[Dict]:
+        """Stream the items of a sort key range, fetching up to max_workers sub-ranges ahead"""
+        ranges = self.split_range(low, high)
+        last = len(ranges) - 1
+        tasks = [
+            (partition, range_low, range_high, index == last, descending)
+            for index, (range_low, range_high) in enumerate(ranges)
+        ]
+        if descending:
+            tasks.reverse()
+        logger.info(f"fetching {low} to {high} as {len(tasks)} sub-ranges")
+
+        pending = deque()
+        tasks = iter(tasks)
+        for task in tasks:
+            pending.append(self.executor.submit(self.fetch_range, *task))
+            if len(pending) >= self.max_workers:
+                break
+        while pending:
+            with span("dynamodb"):
+                items = pending.popleft().result()
+            task = next(tasks, None)
+            if task is not None:
+                pending.append(self.executor.submit(self.fetch_range, *task))
+            yield from items
@@ -0,0 +1,37 @@
+"""Multi-worker server launch"""
+from typing import Dict
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+
+class AutoUvicornWorker(UvicornWorker):
+    """Uvicorn worker that uses uvloop and httptools only when they are installed"""
+
+    CONFIG_KWARGS = {"loop": "auto", "http": "auto"}
+
+
+class MultiWorkerServer(BaseApplication):
+    """
+    Gunicorn master that runs an already loaded ASGI app in uvicorn worker
+    processes. Workers are forked after the app is loaded, so they inherit
+    anything created at import time, such as the shared answer cache.
+
+    Sending the master SIGHUP replaces the workers gracefully, and workers
+    are recycled after max_requests requests.
+    """
+
+    def __init__(self, application, options: Dict):
+        """Initialize server"""
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        """Apply the server options to the gunicorn config"""
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        """Return the loaded app"""
+        return self.application
@@ -3,7 +3,7 @@ from aws_cdk import Stack
 from constructs import Construct
 
 from api.infrastructure import SygnoAPI
-from database.infrastructure import ApiDB
+from database.infrastructure import ApiDB, EventsDB
 
 
 class CdkSolutionStack(Stack):
@@ -14,5 +14,6 @@ class CdkSolutionStack(Stack):
         super().__init__(scope, construct_id, **kwargs)
 
         api_db = ApiDB(self, "ApiDB")
+        events_db = EventsDB(self, "EventsDB")
 
-        SygnoAPI(self, "SygnoAPI", api_db=api_db)
+        SygnoAPI(self, "SygnoAPI", api_db=api_db, events_db=events_db)
@@ -6,6 +6,9 @@ from constructs import Construct
 
 logger = logging.getLogger(__name__)
 
+# epoch seconds attribute dynamoDB uses to expire items
+ttl_attribute = "expires_at"
+
 
 class ApiDB(Construct):
     """Api Table CDK construct"""
@@ -24,6 +27,7 @@ class ApiDB(Construct):
             sort_key=aws_dynamodb.Attribute(
                 name="sk", type=aws_dynamodb.AttributeType.STRING
             ),
+            time_to_live_attribute=ttl_attribute,
         )
         logger.info(f"Created persistence table with id as pk, path as sk")
 
@@ -48,3 +52,48 @@ class ApiDB(Construct):
         logger.info(
             f"Added {table_name_key}: {self.api_table.table_name} to cfnOutPut"
         )
+
+
+class EventsDB(Construct):
+    """Events Table CDK construct"""
+
+    def __init__(self, scope: Construct, id_: str, **kwargs) -> None:
+        """Initialize events Table construct"""
+        super().__init__(scope, id_, **kwargs)
+
+        # create dynamo table, events age out through the ttl attribute
+        self.events_table = aws_dynamodb.Table(
+            self,
+            "EventsTable",
+            partition_key=aws_dynamodb.Attribute(
+                name="id", type=aws_dynamodb.AttributeType.STRING
+            ),
+            sort_key=aws_dynamodb.Attribute(
+                name="sk", type=aws_dynamodb.AttributeType.STRING
+            ),
+            billing_mode=aws_dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute=ttl_attribute,
+        )
+        logger.info(f"Created events table with id as pk, timestamp as sk")
+
+        # cloudformation resource output values
+        table_arn_key = self.node.try_get_context("events_db_arn_output_key")
+        table_name_key = self.node.try_get_context("events_db_name_output_key")
+        CfnOutput(
+            self,
+            id="cfnEventsTableARN",
+            value=f"{self.events_table.table_arn}",
+            export_name=f"{table_arn_key}",
+        )
+        logger.info(
+            f"Added {table_arn_key}: {self.events_table.table_arn} to cfnOutPut"
+        )
+        CfnOutput(
+            self,
+            id="cfnEventsTableName",
+            value=f"{self.events_table.table_name}",
+            export_name=f"{table_name_key}",
+        )
+        logger.info(
+            f"Added {table_name_key}: {self.events_table.table_name} to cfnOutPut"
+        )
@@ -0,0 +1,102 @@
+"""Script to benchmark expose throughput of the API server from 1 to N worker processes"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from multiprocessing import Pool
+
+EXPOSE_TYPES = ["latest", "24h_devt", "24h_average", "7d_devt", "7d_average"]
+api_src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api", "src")
+
+
+def wait_for_port(port: int, timeout: float = 60.0):
+    """Block until the server accepts connections"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def run_client(options) -> tuple:
+    """Send expose requests over one keep-alive connection for the benchmark duration"""
+    port, api_key, duration, client_index = options
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"x-api-key": api_key, "Content-Type": "application/json"}
+    deadline = time.monotonic() + duration
+    requests, errors = 0, 0
+    while time.monotonic() < deadline:
+        expose_type = EXPOSE_TYPES[(client_index + requests) % len(EXPOSE_TYPES)]
+        connection.request("POST", "/sygno/expose", json.dumps({"type": expose_type}), headers)
+        response = connection.getresponse()
+        response.read()
+        requests += 1
+        if response.status != 200:
+            errors += 1
+    connection.close()
+    return requests, errors
+
+
+def benchmark(workers: int, args) -> dict:
+    """Start the server with a worker count, load it and stop it"""
+    server = subprocess.Popen(
+        [sys.executable, "functions/app.py", "--workers", str(workers), "--port", str(args.port)],
+        cwd=api_src,
+        env={**os.environ, "EXPOSE_CACHE_SECONDS": str(args.expose_cache_seconds)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(args.port)
+        # one pass over every expose type so each run starts from the same cache state
+        run_client((args.port, args.api_key, 0.5, 0))
+        with Pool(args.clients) as pool:
+            started = time.monotonic()
+            results = pool.map(
+                run_client,
+                [(args.port, args.api_key, args.duration, index) for index in range(args.clients)],
+            )
+            elapsed = time.monotonic() - started
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    requests = sum(result[0] for result in results)
+    errors = sum(result[1] for result in results)
+    return {"workers": workers, "requests": requests, "errors": errors, "rps": requests / elapsed}
+
+
+def main():
+    msg = "Benchmark expose throughput of the API server with 1 to N worker processes..."
+    parser = argparse.ArgumentParser(description=msg)
+    parser.add_argument("--max_workers", type=int, default=os.cpu_count())
+    parser.add_argument("--clients", type=int, default=32, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds of load per worker count")
+    parser.add_argument("--port", type=int, default=5105)
+    parser.add_argument("--api_key", required=True, help="x-api-key header of the requests")
+    parser.add_argument("--expose_cache_seconds", type=float, default=30.0,
+                        help="expose answer cache ttl of the server, 0 benchmarks uncached answers")
+    args = parser.parse_args()
+
+    worker_counts = sorted({1, *[2 ** i for i in range(1, 8) if 2 ** i < args.max_workers], args.max_workers})
+    baseline = None
+    print(f"{'workers':>8} {'requests':>9} {'errors':>7} {'req/s':>9} {'speedup':>8}")
+    for workers in worker_counts:
+        result = benchmark(workers, args)
+        baseline = baseline or result["rps"]
+        print(
+            f"{result['workers']:>8} {result['requests']:>9} {result['errors']:>7} "
+            f"{result['rps']:>9.1f} {result['rps'] / baseline:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,14 +7,17 @@ import os
 from typing import Dict
 from decimal import Decimal
 
-import boto3
 from botocore.exceptions import ClientError
 
+from sygno_api.utils import clients
+from sygno_api.utils import dbmethods as dbutils
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 
-dynamodb = boto3.resource("dynamodb", "us-west-1")
+# AWS_ENDPOINT_URL, AWS_REGION and the pool, timeout and retry settings of the service
+clients.configure(clients.ClientSettings())
 
 msg = "Populating the api table with JSON prompts data..."
 parser = argparse.ArgumentParser(description=msg)
@@ -23,7 +26,7 @@ api_table_name: str = (
         "cdk-solution-ApiDBApiTable9B6DE511-4CSR3FGGI5VI"
     )
 
-table = dynamodb.Table(api_table_name)
+table = dbutils.get_db_table(api_table_name)
 
 
 def parse_raw_data(item: Dict, api_key: str) -> Dict:
@@ -32,7 +35,7 @@ def parse_raw_data(item: Dict, api_key: str) -> Dict:
     rows = item["rows"][1:]
     for parameter in rows:
         configuration_parameters[parameter[0]] = parameter[1]
-    table_item = {"id": "action",
+    table_item = {"id": "weather",
                   "sk": item["ts"],
                   "name": item["name"],
                   "event_time": item["ts"],
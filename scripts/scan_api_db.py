@@ -0,0 +1,146 @@
+"""Script to run table-wide maintenance jobs over the api table with a parallel segmented scan"""
+import argparse
+import importlib
+import json
+import logging
+import threading
+from functools import partial
+from typing import Callable, Dict, Optional
+
+from boto3.dynamodb.conditions import Attr
+
+from sygno_api.utils import clients
+from sygno_api.utils import dbmethods as dbutils
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+
+api_table_name: str = (
+        "cdk-solution-ApiDBApiTable9B6DE511-4CSR3FGGI5VI"
+    )
+
+_local = threading.local()
+
+
+def get_worker_table(table_name: str):
+    """table handles are cached per worker thread or process"""
+    if not hasattr(_local, "tables"):
+        _local.tables = {}
+    if table_name not in _local.tables:
+        _local.tables[table_name] = dbutils.get_db_table(table_name)
+    return _local.tables[table_name]
+
+
+def add_item_stats(stats: Dict, item: Dict) -> Dict:
+    """fold one table item into the running table statistics"""
+    stats["count"] += 1
+    stats["bytes"] += len(json.dumps(item, default=dbutils.decimal_default))
+    sk = item.get("sk")
+    if sk is not None:
+        stats["min_sk"] = sk if stats["min_sk"] is None else min(stats["min_sk"], sk)
+        stats["max_sk"] = sk if stats["max_sk"] is None else max(stats["max_sk"], sk)
+    for field in ("id", "name"):
+        counts = stats[f"{field}_counts"]
+        counts[item.get(field)] = counts.get(item.get(field), 0) + 1
+    return stats
+
+
+def merge_stats(segment_stats) -> Dict:
+    """merge the statistics of every scan segment"""
+    merged = new_stats()
+    for stats in segment_stats:
+        merged["count"] += stats["count"]
+        merged["bytes"] += stats["bytes"]
+        for bound, pick in (("min_sk", min), ("max_sk", max)):
+            values = [value for value in (merged[bound], stats[bound]) if value is not None]
+            merged[bound] = pick(values) if values else None
+        for field in ("id_counts", "name_counts"):
+            for key, count in stats[field].items():
+                merged[field][key] = merged[field].get(key, 0) + count
+    return merged
+
+
+def new_stats() -> Dict:
+    """empty table statistics"""
+    return {"count": 0, "bytes": 0, "min_sk": None, "max_sk": None, "id_counts": {}, "name_counts": {}}
+
+
+def load_transform(path: str) -> Callable:
+    """import an item transform given as package.module:function"""
+    module_name, _, function_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def rewrite_item(
+    source_table_name: str,
+    target_table_name: str,
+    partition_id: Optional[str],
+    delete_original: bool,
+    item_transform: Optional[Callable],
+    item: Dict,
+):
+    """write an item to the target table, optionally converted by item_transform
+    and re-keyed under a new partition id"""
+    new_item = item_transform(dict(item)) if item_transform else dict(item)
+    if partition_id:
+        new_item["id"] = partition_id
+    get_worker_table(target_table_name).put_item(Item=new_item)
+    moved = target_table_name != source_table_name or new_item["id"] != item["id"]
+    if delete_original and moved:
+        get_worker_table(source_table_name).delete_item(Key={"id": item["id"], "sk": item["sk"]})
+    return new_item
+
+
+def main():
+    msg = "Run a parallel segmented scan job over the api table..."
+    parser = argparse.ArgumentParser(description=msg)
+    parser.add_argument("job", choices=["stats", "rewrite"])
+    parser.add_argument("--table", default=api_table_name)
+    parser.add_argument("--segments", type=int, default=4)
+    parser.add_argument("--processes", action="store_true", help="use a process pool instead of threads")
+    parser.add_argument("--checkpoint-dir", default=None, help="save per segment progress to resume the job")
+    parser.add_argument("--read-capacity", type=float, default=None, help="target read capacity units per second")
+    parser.add_argument("--source-id", default=None, help="only scan the items of this partition id")
+    parser.add_argument("--target-table", default=None, help="rewrite: table to write items to")
+    parser.add_argument("--partition-id", default=None, help="rewrite: new partition id for every item")
+    parser.add_argument("--delete-original", action="store_true", help="rewrite: delete items that were moved or re-keyed")
+    parser.add_argument("--transform", default=None,
+                        help="rewrite: package.module:function converting each item into the new format")
+    parser.add_argument("--job-id", default=None,
+                        help="checkpoint name of the job, derived from the job and its options by default")
+    args = parser.parse_args()
+    # AWS_ENDPOINT_URL, AWS_REGION and the pool, timeout and retry settings of the service
+    clients.configure(clients.ClientSettings())
+
+    target_table = args.target_table or args.table
+    job_id = args.job_id or args.job
+    if args.job == "rewrite" and not args.job_id:
+        job_id = "-".join([
+            "rewrite", args.source_id or "all", target_table, args.partition_id or "same-id", args.transform or "copy"
+        ])
+    scan_options = dict(
+        total_segments=args.segments,
+        use_processes=args.processes,
+        checkpoint_dir=args.checkpoint_dir,
+        read_capacity=args.read_capacity,
+        job_id=job_id.replace(":", "."),
+    )
+    if args.source_id:
+        # a re-key must not sweep up the other partitions sharing the table
+        scan_options["FilterExpression"] = Attr("id").eq(args.source_id)
+    if args.job == "stats":
+        segment_stats = dbutils.parallel_scan(
+            args.table, reduce=add_item_stats, initial=new_stats(), **scan_options
+        )
+        print(json.dumps(merge_stats(segment_stats), indent=2, default=dbutils.decimal_default))
+    else:
+        item_transform = load_transform(args.transform) if args.transform else None
+        transform = partial(
+            rewrite_item, args.table, target_table, args.partition_id, args.delete_original, item_transform
+        )
+        counts = dbutils.parallel_scan(args.table, transform=transform, **scan_options)
+        print(f"Rewrote {sum(counts)} items")
+
+
+if __name__ == "__main__":
+    main()
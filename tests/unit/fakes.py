@@ -0,0 +1,44 @@
+"""In-memory stand-ins for dynamoDB table handles and service settings"""
+from types import SimpleNamespace
+
+
+class FakeQueryTable:
+    """table answering between(low, high) sort key queries, two items per page"""
+
+    def __init__(self, items=()):
+        self.items = sorted(items, key=lambda item: item["sk"])
+
+    def put_item(self, Item):
+        self.items = sorted(
+            [item for item in self.items if (item["id"], item["sk"]) != (Item["id"], Item["sk"])] + [Item],
+            key=lambda item: item["sk"],
+        )
+        return {}
+
+    def query(self, KeyConditionExpression, ScanIndexForward=True, ExclusiveStartKey=None, **kwargs):
+        partition, between = KeyConditionExpression.get_expression()["values"]
+        partition_id = partition.get_expression()["values"][1]
+        low, high = between.get_expression()["values"][1:]
+        items = [item for item in self.items if item["id"] == partition_id and low <= item["sk"] <= high]
+        if not ScanIndexForward:
+            items.reverse()
+        offset = ExclusiveStartKey["offset"] if ExclusiveStartKey else 0
+        response = {"Items": items[offset:offset + 2]}
+        if offset + 2 < len(items):
+            response["LastEvaluatedKey"] = {"offset": offset + 2}
+        return response
+
+
+def fake_settings(**overrides):
+    """the service settings sygnoAPI reads"""
+    settings = dict(
+        api_table_name="table",
+        raw_data_retention_days=None,
+        range_fetch_workers=2,
+        range_fetch_target_items=1000,
+        hot_tier_days=0,
+        hot_tier_max_items=100000,
+        ingest_mode="sync",
+    )
+    settings.update(overrides)
+    return SimpleNamespace(**settings)
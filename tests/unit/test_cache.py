@@ -0,0 +1,90 @@
+import time
+from types import SimpleNamespace
+
+from botocore.exceptions import EndpointConnectionError
+from sygno_api.api.cache import AnswerCache
+from sygno_api.api.schema import ExposeResponse
+
+
+def answer(description="answer"):
+    return ExposeResponse(status="200", description=description, data={})
+
+
+def test_expired_answers_are_dropped():
+    cache = AnswerCache(ttl_seconds=0.05)
+    cache.set("a", answer())
+    assert cache.get("a") == answer()
+
+    time.sleep(0.1)
+    cache.set("b", answer())
+
+    assert cache.get("a") is None
+    assert list(cache.entries) == ["b"]
+
+
+def test_oldest_answers_are_dropped_beyond_max_entries():
+    cache = AnswerCache(ttl_seconds=60, max_entries=3)
+    for key in "abcd":
+        cache.set(key, answer(key))
+
+    assert list(cache.entries) == ["b", "c", "d"]
+    assert cache.get("a") is None
+
+
+def test_zero_ttl_only_keeps_answers_set_with_their_own_ttl():
+    cache = AnswerCache(ttl_seconds=0)
+    cache.set("request", answer())
+    cache.set("warm-up", answer(), ttl_seconds=60)
+
+    assert cache.get("request") is None
+    assert cache.get("warm-up") == answer()
+    cache.clear()
+    assert cache.get("warm-up") is None
+
+
+def test_warm_up_reports_failures_as_degraded(monkeypatch):
+    from functions import app
+
+    def fail_load():
+        raise EndpointConnectionError(endpoint_url="http://dynamodb")
+
+    def get_data(item):
+        if item.type == "latest":
+            raise IndexError("list index out of range")
+        return answer(item.type)
+
+    monkeypatch.setattr(app.sygno_api, "get_table", lambda: SimpleNamespace(load=fail_load))
+    monkeypatch.setattr(app.event_log, "get_table", lambda: SimpleNamespace(load=lambda: None))
+    monkeypatch.setattr(app.sygno_api, "get_data", get_data)
+    monkeypatch.setattr(app, "expose_cache", AnswerCache(ttl_seconds=0))
+    monkeypatch.setattr(app.settings, "warmup_expose_types", ["latest", "24h_devt", "24h_average", "7d_devt", "7d_average"])
+
+    readiness = app.warm_up()
+
+    assert readiness["status"] == "degraded"
+    assert readiness["primed"] == ["24h_devt", "24h_average", "7d_devt", "7d_average"]
+    assert len(readiness["errors"]) == 2
+    # warm-up answers outlive the warm-up schedule even with request caching off
+    assert app.expose_cache.get(app.ExposeRequest(type="7d_devt").json(sort_keys=True)) == answer("7d_devt")
+
+
+def test_warm_up_queries_latest_without_caching_it(monkeypatch):
+    from functions import app
+
+    queried = []
+
+    def get_data(item):
+        queried.append(item.type)
+        return answer(item.type)
+
+    monkeypatch.setattr(app.sygno_api, "get_table", lambda: SimpleNamespace(load=lambda: None))
+    monkeypatch.setattr(app.event_log, "get_table", lambda: SimpleNamespace(load=lambda: None))
+    monkeypatch.setattr(app.sygno_api, "get_data", get_data)
+    monkeypatch.setattr(app, "expose_cache", AnswerCache(ttl_seconds=0))
+    monkeypatch.setattr(app.settings, "warmup_expose_types", ["latest", "24h_devt"])
+
+    readiness = app.warm_up()
+
+    assert queried == ["latest", "24h_devt"]
+    assert readiness["primed"] == ["24h_devt"]
+    assert app.expose_cache.get(app.ExposeRequest(type="latest").json(sort_keys=True)) is None
@@ -19,3 +19,24 @@ def test_sns_topic_created():
     template = assertions.Template.from_stack(stack)
 
     template.resource_count_is("AWS::SNS::Topic", 1)
+
+
+def test_events_table_created_with_ttl():
+    app = core.App()
+    stack = CdkSolutionStack(app, "cdk-solution")
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::DynamoDB::Table", 2)
+    template.has_resource_properties("AWS::DynamoDB::Table", {
+        "TimeToLiveSpecification": {"AttributeName": "expires_at", "Enabled": True}
+    })
+
+
+def test_warmup_rule_created():
+    app = core.App()
+    stack = CdkSolutionStack(app, "cdk-solution")
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Events::Rule", {
+        "ScheduleExpression": "rate(5 minutes)"
+    })
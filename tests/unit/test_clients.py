@@ -0,0 +1,60 @@
+import threading
+
+from sygno_api.utils import clients
+
+
+def test_each_thread_gets_its_own_resource_and_shares_the_client():
+    manager = clients.ClientManager()
+    resources = []
+
+    def get_resources():
+        resources.append((manager.resource("dynamodb"), manager.resource("dynamodb")))
+
+    threads = [threading.Thread(target=get_resources) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(first is second for first, second in resources)
+    assert len({id(first) for first, _ in resources}) == 3
+    assert manager.client("dynamodb") is manager.client("dynamodb")
+
+
+def test_client_settings_are_read_from_the_environment(monkeypatch):
+    monkeypatch.setenv("AWS_ENDPOINT_URL", "http://localhost:8000")
+    monkeypatch.setenv("AWS_MAX_ATTEMPTS", "2")
+    # the process manager is put back after the test
+    monkeypatch.setattr(clients, "_manager", None)
+
+    manager = clients.configure(clients.ClientSettings())
+
+    assert clients.get_manager() is manager
+    assert manager.endpoint_url == "http://localhost:8000"
+    assert manager.config.retries["max_attempts"] == 2
+
+
+def test_api_and_event_tables_are_built_per_thread(monkeypatch):
+    import sygno_api.api as api
+    from sygno_api.events.event_logger import EventLogger
+    from sygno_api.utils import dbmethods as dbutils
+
+    from tests.unit.fakes import fake_settings
+
+    monkeypatch.setattr(dbutils, "get_db_table", lambda table_name: object())
+    settings = fake_settings(events_table_name="events", stack_name="stack", events_table_output_key="EventsTableName",
+                             app_version="test", event_retention_days={}, default_event_retention_days=7)
+    owners = [api.sygnoAPI(settings), EventLogger(settings)]
+    tables = []
+
+    def get_tables():
+        tables.append([owner.get_table() for owner in owners])
+        assert [owner.get_table() for owner in owners] == tables[-1]
+
+    thread = threading.Thread(target=get_tables)
+    thread.start()
+    thread.join()
+    get_tables()
+
+    assert len(tables) == 2
+    assert all(ours is not theirs for ours, theirs in zip(*tables))
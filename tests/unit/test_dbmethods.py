@@ -0,0 +1,39 @@
+from sygno_api.utils import dbmethods as dbutils
+
+
+class FakeScanTable:
+    """table returning one page of items per scan call"""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def scan(self, **kwargs):
+        index = kwargs.get("ExclusiveStartKey", {}).get("page", 0)
+        response = {"Items": self.pages[index]}
+        if index + 1 < len(self.pages):
+            response["LastEvaluatedKey"] = {"page": index + 1}
+        return response
+
+
+def test_checkpoints_are_kept_per_table_and_job(tmp_path):
+    dbutils.save_checkpoint(str(tmp_path), "table", "stats", 0, 2, {"accumulator": 1, "done": True})
+
+    assert dbutils.load_checkpoint(str(tmp_path), "table", "stats", 0, 2)["accumulator"] == 1
+    assert dbutils.load_checkpoint(str(tmp_path), "table", "rewrite", 0, 2) is None
+    assert dbutils.load_checkpoint(str(tmp_path), "other-table", "stats", 0, 2) is None
+
+
+def test_jobs_sharing_a_checkpoint_dir_do_not_resume_each_other(tmp_path, monkeypatch):
+    table = FakeScanTable([[{"sk": "a"}, {"sk": "b"}], [{"sk": "c"}]])
+    monkeypatch.setattr(dbutils, "get_db_table", lambda table_name: table)
+
+    stats = dbutils.scan_segment(
+        "table", 0, 1, reduce=lambda acc, item: acc + [item["sk"]], initial=[],
+        checkpoint_dir=str(tmp_path), job_id="stats",
+    )
+    count = dbutils.scan_segment("table", 0, 1, checkpoint_dir=str(tmp_path), job_id="rewrite")
+
+    assert stats == ["a", "b", "c"]
+    assert count == 3
+    # a finished job is answered from its own checkpoint
+    assert dbutils.scan_segment("table", 0, 1, checkpoint_dir=str(tmp_path), job_id="stats") == stats
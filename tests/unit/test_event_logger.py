@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+
+from botocore.exceptions import NoCredentialsError
+from sygno_api.api import parse_raw_data
+from sygno_api.api.schema import WriteRequest
+from sygno_api.events.event_logger import EventLogger
+from sygno_api.utils import cfnutils
+from sygno_api.utils import dbmethods as dbutils
+
+from tests.unit.fakes import FakeQueryTable, fake_settings
+
+logged_at = datetime(2021, 5, 14, 8, 0, tzinfo=timezone.utc)
+
+
+def event_logger(**overrides):
+    settings = dict(events_table_name="events", stack_name="stack", events_table_output_key="EventsTableName",
+                    app_version="test", event_retention_days={"read_response": 1, "audit": 0},
+                    default_event_retention_days=7)
+    settings.update(overrides)
+    return EventLogger(fake_settings(**settings))
+
+
+def test_events_expire_after_the_retention_of_their_type():
+    events = event_logger()
+
+    assert events.get_expiry("read_response", logged_at) == int(datetime(2021, 5, 15, 8, tzinfo=timezone.utc).timestamp())
+    assert events.get_expiry("write_request", logged_at) == int(datetime(2021, 5, 21, 8, tzinfo=timezone.utc).timestamp())
+    # a retention of 0 keeps the event forever
+    assert events.get_expiry("audit", logged_at) is None
+
+
+def test_raw_readings_expire_relative_to_their_timestamp():
+    item = WriteRequest(data={"ts": "2021-05-14T10:30:00+02:00", "name": "w", "rows": [["name", "value"], ["temp", 1]]})
+
+    assert "expires_at" not in parse_raw_data(item, "key")
+    assert parse_raw_data(item, "key", retention_days=2)["expires_at"] == int(
+        datetime(2021, 5, 16, 8, 30, tzinfo=timezone.utc).timestamp()
+    )
+
+
+def test_unset_events_table_is_read_from_the_stack_outputs(monkeypatch):
+    tables = {"cdk-solution-EventsTable": FakeQueryTable()}
+    lookups = []
+
+    def get_output(stack_name, export_name):
+        lookups.append((stack_name, export_name))
+        return {"ExportName": export_name, "OutputValue": "cdk-solution-EventsTable"}
+
+    monkeypatch.setattr(cfnutils, "get_stack_cfn_output_value", get_output)
+    monkeypatch.setattr(dbutils, "get_db_table", lambda table_name: tables[table_name])
+    events = event_logger(events_table_name=None)
+
+    events.log("key", "read_request", {"type": "latest"})
+    events.log("key", "read_request", {"type": "7d_devt"})
+
+    assert lookups == [("stack", "EventsTableName")]
+    assert [item["data"] for item in tables["cdk-solution-EventsTable"].items] == [
+        {"type": "latest"}, {"type": "7d_devt"}
+    ]
+    assert all(item["id"] == "event" for item in tables["cdk-solution-EventsTable"].items)
+
+
+def test_events_are_dropped_when_the_stack_cannot_be_read(monkeypatch):
+    def get_output(stack_name, export_name):
+        raise NoCredentialsError()
+
+    monkeypatch.setattr(cfnutils, "get_stack_cfn_output_value", get_output)
+    events = event_logger(events_table_name=None)
+
+    events.log("key", "read_request", {"type": "latest"})
+
+    assert events.events_table_name is None
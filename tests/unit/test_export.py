@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+from decimal import Decimal
+
+import pytest
+from pydantic import ValidationError
+from sygno_api.api import export
+from sygno_api.api.schema import ExportRequest
+
+
+def reading(sk, **data):
+    return {"id": "weather", "sk": sk, "name": "w", "event_time": sk, "user_id": "write-key", "expires_at": 1,
+            "data": data}
+
+
+def encode(pages, export_format):
+    return b"".join(export.export_items(pages, export_format))
+
+
+def test_csv_export_keeps_columns_missing_from_the_first_row():
+    pages = [
+        [reading("2021-05-14T00:00:00", temp=Decimal("20")),
+         reading("2021-05-14T00:05:00", temp=Decimal("20.5"), wind=Decimal("3"))],
+        [reading("2021-05-14T00:10:00", temp=Decimal("21"), gust=Decimal("7"))],
+    ]
+    rows = list(csv.DictReader(io.StringIO(encode(pages, "csv").decode())))
+
+    assert [row["temp"] for row in rows] == ["20.0", "20.5", "21.0"]
+    assert rows[1]["wind"] == "3.0"
+    # first seen after the first page
+    assert json.loads(rows[2]["extra_data"]) == {"gust": 7}
+
+
+def test_parquet_export_uses_float_and_string_columns():
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    pages = [
+        [reading("2021-05-14T00:00:00", temp=Decimal("20"), rain=None,
+                 wind_direction_compass={"key": Decimal("2"), "value": "NE"})],
+        [reading("2021-05-14T00:05:00", temp=Decimal("20.5"), rain=Decimal("0.25"),
+                 wind_direction_compass={"key": Decimal("3"), "value": "E"})],
+    ]
+    table = pq.read_table(pa.BufferReader(encode(pages, "parquet")))
+
+    assert table.schema.field("temp").type == pa.float64()
+    assert table.schema.field("rain").type == pa.float64()
+    assert table.schema.field("wind_direction_compass").type == pa.string()
+    assert table.column("temp").to_pylist() == [20.0, 20.5]
+    assert table.column("rain").to_pylist() == [None, 0.25]
+
+
+def test_exports_leave_out_internal_fields_and_the_writers_key():
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    pages = [[reading("2021-05-14T00:00:00+02:00", temp=Decimal("20"))]]
+
+    lines = encode(pages, "ndjson").decode().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"name": "w", "timestamp": "2021-05-14T00:00:00+02:00", "fraud_data": {"temp": 20}}
+    ]
+    header = encode(pages, "csv").decode().splitlines()[0]
+    assert header == "name,timestamp,temp,extra_data"
+    table = pq.read_table(pa.BufferReader(encode(pages, "parquet")))
+    assert table.schema.names == ["name", "timestamp", "temp", "extra_data"]
+
+
+@pytest.mark.parametrize("start, end", [
+    ("2021-05-14", "2021-05-13"),
+    ("2021-05-14T10:00:00", "2021-05-14T11:00:00"),
+    ("2021-05-14T10:00:00+02:00", "2021-05-14T09:00:00+02:00"),
+    ("2021-05-14T10:00:00+02:00", "2021-05-14T09:30:00+01:00"),
+])
+def test_unzoned_or_reversed_ranges_are_rejected(start, end):
+    with pytest.raises(ValidationError):
+        ExportRequest(start=start, end=end)
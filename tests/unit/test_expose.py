@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+import sygno_api.api as api
+from pydantic import ValidationError
+from sygno_api.api.schema import ExposeRequest
+from sygno_api.utils import dbmethods as dbutils
+
+from tests.unit.fakes import FakeQueryTable, fake_settings
+
+start = datetime(2021, 5, 6, 0, 0, tzinfo=timezone(timedelta(hours=2)))
+
+
+@pytest.fixture
+def sygno(monkeypatch):
+    # a reading every 5 minutes for 10 days
+    items = []
+    for index in range(10 * 24 * 12):
+        sk = (start + timedelta(minutes=5 * index)).isoformat()
+        items.append({"id": "weather", "sk": sk, "name": "w", "event_time": sk, "data": {"temp": Decimal(index % 7)}})
+    table = FakeQueryTable(items)
+    monkeypatch.setattr(dbutils, "get_db_table", lambda table_name: table)
+    return api.sygnoAPI(fake_settings())
+
+
+def test_24h_increments_follow_the_quarter_hours(sygno):
+    data = sygno.get_24h_devt().data
+
+    assert len(data) == 96
+    assert all(datetime.fromisoformat(key).minute % 15 == 0 for key in data)
+    assert list(data) == sorted(data, reverse=True)
+
+
+def test_24h_delta_merges_into_the_earlier_series(sygno, monkeypatch):
+    monkeypatch.setattr(api, "now", "2021-05-14T10:34:21+02:00")
+    earlier = sygno.get_24h_devt()
+    monkeypatch.setattr(api, "now", "2021-05-14T11:27:03+02:00")
+    delta = sygno.get_24h_devt(earlier.cursor)
+    later = sygno.get_24h_devt()
+
+    assert list(delta.data) == ["2021-05-14T11:15:00+02:00", "2021-05-14T11:00:00+02:00", "2021-05-14T10:45:00+02:00"]
+    merged = {**earlier.data, **delta.data}
+    assert {key: merged[key] for key in later.data} == later.data
+    assert delta.cursor == later.cursor
+
+
+def test_7d_delta_replaces_the_days_from_the_cursor_on(sygno, monkeypatch):
+    monkeypatch.setattr(api, "now", "2021-05-13T22:10:00+02:00")
+    earlier = sygno.get_7d_devt()
+    monkeypatch.setattr(api, "now", "2021-05-14T10:34:21+02:00")
+    delta = sygno.get_7d_devt(earlier.cursor)
+    later = sygno.get_7d_devt()
+
+    assert list(earlier.data) == [f"2021-05-{day:02d}" for day in range(13, 6, -1)]
+    assert list(later.data) == [f"2021-05-{day:02d}" for day in range(14, 7, -1)]
+    assert list(delta.data) == ["2021-05-14", "2021-05-13"]
+    merged = {**earlier.data, **delta.data}
+    assert {key: merged[key] for key in later.data} == later.data
+
+
+@pytest.mark.parametrize("since", ["2021-05-14Tx", "yesterday", "2021-05-14T10:34:21"])
+def test_malformed_cursors_are_rejected(since):
+    with pytest.raises(ValidationError):
+        ExposeRequest(type="24h_devt", since=since)
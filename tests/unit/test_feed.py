@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+from sygno_api.api.feed import ReadingFeed
+
+
+class FakeRequest:
+    """connection that disconnects when told to"""
+
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+def test_readings_are_fanned_out_to_every_subscriber():
+    async def run():
+        feed = ReadingFeed(queue_size=10, heartbeat_seconds=5)
+        streams = [feed.subscribe(FakeRequest()) for _ in range(3)]
+        for stream in streams:
+            assert await stream.__anext__() == ": connected\n\n"
+        feed.publish("reading", {"temp": 1}, "2021-05-14T10:30:00+02:00")
+        received = [await stream.__anext__() for stream in streams]
+        for stream in streams:
+            await stream.aclose()
+        return feed, received
+
+    feed, received = asyncio.run(run())
+
+    assert received == ['event: reading\nid: 2021-05-14T10:30:00+02:00\ndata: {"temp": 1}\n\n'] * 3
+    assert feed.metrics() == {"subscribers": 0, "published": 1, "dropped": 0}
+
+
+def test_lagging_subscriber_loses_its_oldest_events():
+    async def run():
+        feed = ReadingFeed(queue_size=2, heartbeat_seconds=5)
+        stream = feed.subscribe(FakeRequest())
+        await stream.__anext__()
+        for index in range(5):
+            feed.publish("reading", {"index": index})
+        received = [await stream.__anext__() for _ in range(3)]
+        await stream.aclose()
+        return feed, received
+
+    feed, (lagged, *readings) = asyncio.run(run())
+
+    assert lagged == 'event: lagged\ndata: {"dropped": 3}\n\n'
+    assert [json.loads(message.split("data: ")[1]) for message in readings] == [{"index": 3}, {"index": 4}]
+    assert feed.metrics()["dropped"] == 3
+
+
+def test_subscriber_is_removed_when_the_connection_drops():
+    async def run():
+        feed = ReadingFeed(queue_size=10, heartbeat_seconds=0.01)
+        request = FakeRequest()
+        stream = feed.subscribe(request)
+        await stream.__anext__()
+        assert await stream.__anext__() == ": keep-alive\n\n"
+        assert len(feed.subscribers) == 1
+        request.disconnected = True
+        remaining = [message async for message in stream]
+        return feed, remaining
+
+    feed, remaining = asyncio.run(run())
+
+    assert remaining == []
+    assert feed.subscribers == set()
+
+
+def test_subscribe_through_the_lambda_handler_answers_501():
+    from functions import app
+
+    event = {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": "/sygno/subscribe",
+        "rawQueryString": "",
+        "headers": {"host": "api.example.com", "x-api-key": app.READ_KEYS[0]},
+        "requestContext": {
+            "http": {"method": "GET", "path": "/sygno/subscribe", "protocol": "HTTP/1.1", "sourceIp": "127.0.0.1"},
+            "stage": "$default",
+        },
+        "isBase64Encoded": False,
+    }
+
+    # Mangum runs the app on the thread's event loop, which the asyncio.run calls above have unset
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        response = app.handler(event, {})
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+    assert response["statusCode"] == 501
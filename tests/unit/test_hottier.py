@@ -0,0 +1,101 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import sygno_api.api as api
+from sygno_api.api.hottier import HotTier
+from sygno_api.api.schema import WriteRequest
+from sygno_api.utils import dbmethods as dbutils
+
+from tests.unit.fakes import FakeQueryTable, fake_settings
+
+start = datetime(2021, 5, 14, 0, 0, tzinfo=timezone(timedelta(hours=2)))
+
+
+def timestamp(minutes):
+    return (start + timedelta(minutes=minutes)).isoformat()
+
+
+def reading(minutes, temp=1):
+    return {"id": "weather", "sk": timestamp(minutes), "name": "w", "event_time": timestamp(minutes),
+            "data": {"temp": Decimal(temp)}}
+
+
+def test_range_is_answered_from_the_backfilled_window():
+    tier = HotTier("weather", window_days=1)
+    tier.backfill([reading(minutes) for minutes in range(0, 100, 10)], timestamp(0))
+
+    assert [item["sk"] for item in tier.range(timestamp(20), timestamp(40))] == [
+        timestamp(40), timestamp(30), timestamp(20)
+    ]
+    assert tier.range(timestamp(-10), timestamp(40)) is None
+    assert tier.metrics()["hits"] == 1 and tier.metrics()["misses"] == 1
+
+
+def test_backfill_larger_than_max_items_only_covers_the_retained_readings():
+    tier = HotTier("weather", window_days=1, max_items=10)
+    tier.backfill([reading(minutes) for minutes in range(100)], timestamp(0))
+
+    # the dropped readings must come from dynamoDB, not a partial answer
+    assert tier.range(timestamp(0), timestamp(99)) is None
+    assert len(tier.range(timestamp(90), timestamp(99))) == 10
+    assert tier.coverage_start == datetime.fromisoformat(timestamp(90)).timestamp()
+
+
+def test_readings_of_other_partitions_are_ignored():
+    tier = HotTier("weather", window_days=1)
+    tier.backfill([], timestamp(0))
+    tier.add({**reading(5), "id": "event"})
+
+    assert tier.range(timestamp(0), timestamp(10)) == []
+
+
+def test_written_reading_is_visible_through_query_range(monkeypatch):
+    table = FakeQueryTable([reading(minutes) for minutes in range(0, 600, 15)])
+    monkeypatch.setattr(dbutils, "get_db_table", lambda table_name: table)
+    high = "2021-05-14T10:34:21+02:00"
+    written = WriteRequest(data={"ts": "2021-05-14T10:30:00+02:00", "name": "w", "rows": [["name", "value"], ["temp", 21.5]]})
+
+    for hot_tier_days in (0, 1):
+        sygno = api.sygnoAPI(fake_settings(hot_tier_days=hot_tier_days))
+        list(sygno.query_range(timestamp(0), high))
+        assert sygno.save_raw_data(written, "key").status == "200"
+
+        newest = next(iter(sygno.query_range(timestamp(0), high)))
+        assert newest["sk"] == "2021-05-14T10:30:00+02:00"
+        assert newest["data"] == {"temp": Decimal("21.5")}
+
+
+class BlockingQueryTable(FakeQueryTable):
+    """table whose queries wait until released"""
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.querying = threading.Event()
+        self.release = threading.Event()
+
+    def query(self, **kwargs):
+        self.querying.set()
+        assert self.release.wait(5)
+        return super().query(**kwargs)
+
+
+def test_writes_are_not_held_up_by_a_backfill(monkeypatch):
+    table = BlockingQueryTable([reading(minutes) for minutes in range(0, 660, 15)])
+    monkeypatch.setattr(dbutils, "get_db_table", lambda table_name: table)
+    sygno = api.sygnoAPI(fake_settings(hot_tier_days=1))
+    high = "2021-05-14T10:34:21+02:00"
+    backfill = threading.Thread(target=lambda: list(sygno.query_range(timestamp(0), high)))
+    backfill.start()
+    assert table.querying.wait(5)
+
+    # the stored 10:30 reading is rewritten while the backfill still waits on its query
+    written = WriteRequest(data={"ts": timestamp(630), "name": "w", "rows": [["name", "value"], ["temp", 99]]})
+    table.put_item = lambda Item: {}
+    assert sygno.save_raw_data(written, "key").status == "200"
+    table.release.set()
+    backfill.join(5)
+
+    newest = next(iter(sygno.query_range(timestamp(0), high)))
+    assert newest["sk"] == timestamp(630)
+    assert newest["data"] == {"temp": Decimal(99)}
@@ -0,0 +1,88 @@
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+import sygno_api.api as api
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sygno_api.utils import dbmethods as dbutils
+from sygno_api.utils import profiling
+
+from tests.unit.fakes import FakeQueryTable, fake_settings
+
+
+def test_spans_outside_a_profiled_request_do_nothing():
+    with profiling.span("dynamodb") as stage:
+        pass
+
+    assert stage is profiling._null_span
+
+
+def test_nested_spans_are_taken_out_of_their_parent():
+    profile = profiling.RequestProfile("/sygno/expose")
+
+    def get_data():
+        for _ in range(2):
+            with profiling.span("aggregation"):
+                time.sleep(0.01)
+                with profiling.span("dynamodb"):
+                    time.sleep(0.05)
+
+    profile.run(get_data)
+
+    assert profile.spans["aggregation"]["count"] == 2
+    assert profile.spans["dynamodb"]["seconds"] >= 0.1
+    assert 0.02 <= profile.spans["aggregation"]["seconds"] < 0.1
+    # the run itself includes every stage
+    assert profile.spans["get_data"]["seconds"] >= 0.12
+    assert profile.server_timing().startswith("dynamodb;dur=")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from functions import app
+
+    start = datetime.fromisoformat(api.now) - timedelta(hours=2)
+    items = []
+    for index in range(24):
+        sk = (start + timedelta(minutes=5 * index)).isoformat()
+        items.append({"id": "weather", "sk": sk, "name": "w", "event_time": sk, "data": {"temp": Decimal(index)}})
+    table = FakeQueryTable(items)
+    monkeypatch.setattr(dbutils, "get_db_table", lambda table_name: table)
+    monkeypatch.setattr(app, "sygno_api", api.sygnoAPI(fake_settings()))
+    monkeypatch.setattr(app.event_log, "log", lambda *args: None)
+    monkeypatch.setattr(app.settings, "profile_key", "secret")
+    monkeypatch.setattr(app.settings, "profile_sample_rate", 0.0)
+    monkeypatch.setattr(app.settings, "profile_output_dir", None)
+    # the service app only installs the middleware when profiling is configured at import
+    profiled = FastAPI()
+    profiled.include_router(app.app.router)
+    profiled.middleware("http")(app.profile_requests)
+    return app, TestClient(profiled)
+
+
+def expose(client, **headers):
+    return client.post("/sygno/expose", json={"type": "24h_average"},
+                       headers={"x-api-key": "A39658387A1C13B94E78A7F37BDCB", **headers})
+
+
+def test_requests_with_the_profile_key_get_the_stage_breakdown(client):
+    app, client = client
+
+    profiled = expose(client, **{"x-profile": "secret"})
+    unprofiled = expose(client, **{"x-profile": "guess"})
+
+    stages = [entry.split(";")[0] for entry in profiled.headers["Server-Timing"].split(", ")]
+    assert {"dynamodb", "aggregation", "pydantic", "get_data", "serialization", "total"} <= set(stages)
+    assert "X-Profile-Id" in profiled.headers
+    assert profiled.json() == unprofiled.json()
+    assert "Server-Timing" not in unprofiled.headers
+
+
+def test_sampled_requests_are_profiled_without_the_key(client, monkeypatch):
+    app, client = client
+    monkeypatch.setattr(app.settings, "profile_key", None)
+    monkeypatch.setattr(app.settings, "profile_sample_rate", 1.0)
+
+    assert "Server-Timing" in expose(client).headers
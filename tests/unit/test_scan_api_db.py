@@ -0,0 +1,23 @@
+import sys
+
+from scripts import scan_api_db
+from sygno_api.utils import dbmethods as dbutils
+
+
+def test_rewrite_only_scans_the_source_partition(monkeypatch):
+    calls = []
+
+    def parallel_scan(table_name, **scan_options):
+        calls.append(scan_options)
+        return [0]
+
+    monkeypatch.setattr(dbutils, "parallel_scan", parallel_scan)
+    monkeypatch.setattr(scan_api_db.clients, "configure", lambda settings: None)
+    monkeypatch.setattr(sys, "argv", ["scan_api_db.py", "rewrite", "--source-id", "action", "--partition-id", "weather"])
+
+    scan_api_db.main()
+
+    condition = calls[0]["FilterExpression"].get_expression()
+    assert condition["operator"] == "="
+    assert [getattr(value, "name", value) for value in condition["values"]] == ["id", "action"]
+    assert calls[0]["job_id"] == "rewrite-action-cdk-solution-ApiDBApiTable9B6DE511-4CSR3FGGI5VI-weather-copy"
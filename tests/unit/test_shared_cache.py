@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import uuid
+from decimal import Decimal
+from multiprocessing import shared_memory
+
+import pytest
+from sygno_api.api.cache import SharedAnswerCache
+from sygno_api.api.schema import ExposeResponse, FraudItem
+
+
+def answer(value="1.5"):
+    item = FraudItem(name="w", timestamp="2021-05-14T10:30:00+02:00", fraud_data={"temp": Decimal(value)})
+    return ExposeResponse(status="200", description="latest fraud data", data={"latest": item})
+
+
+@pytest.fixture
+def cache():
+    cache = SharedAnswerCache(f"sygno-test-{uuid.uuid4().hex[:8]}", ttl_seconds=60, slots=8, slot_bytes=4096)
+    yield cache
+    cache.close()
+
+
+def set_answer(cache, key, value):
+    cache.set(key, answer(value))
+
+
+def test_answers_set_by_another_process_are_served(cache):
+    process = multiprocessing.get_context("fork").Process(target=set_answer, args=(cache, "latest", "2.25"))
+    process.start()
+    process.join()
+
+    cached = cache.get("latest")
+    assert cached == answer("2.25")
+    # numbers come back as Decimal like answers read from the table
+    assert isinstance(cached.data["latest"].fraud_data["temp"], Decimal)
+    assert cache.get("other") is None
+
+
+def test_oversize_answers_are_not_cached(cache):
+    big = ExposeResponse(status="200", description="x" * 5000, data={})
+    cache.set("big", big)
+
+    assert cache.get("big") is None
+    assert cache.metrics()["oversize"] == 1
+
+
+def test_clear_expires_every_answer(cache):
+    cache.set("latest", answer())
+    cache.clear()
+
+    assert cache.get("latest") is None
+
+
+def test_close_removes_the_block_and_a_leftover_block_is_replaced():
+    name = f"sygno-test-{uuid.uuid4().hex[:8]}"
+    leftover = shared_memory.SharedMemory(name=name, create=True, size=16)
+    leftover.buf[:4] = b"junk"
+
+    cache = SharedAnswerCache(name, ttl_seconds=60, slots=8, slot_bytes=4096)
+    assert cache.memory.size >= 8 * 4096
+    assert cache.get("latest") is None
+    cache.close()
+    leftover.close()
+
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+    assert not os.path.exists(cache.lock_path)
+
+
+def open_cache(name, results):
+    try:
+        SharedAnswerCache(name, ttl_seconds=60, slots=8, slot_bytes=4096)
+    except RuntimeError:
+        results.put("refused")
+    else:
+        results.put("created")
+
+
+def test_a_block_owned_by_a_running_server_is_not_taken_over(cache):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    cache.set("latest", answer())
+
+    process = context.Process(target=open_cache, args=(cache.memory.name.lstrip("/"), results))
+    process.start()
+    process.join()
+
+    assert results.get(timeout=5) == "refused"
+    assert cache.get("latest") == answer()
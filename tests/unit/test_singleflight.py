@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+import pytest
+from sygno_api.api.singleflight import SingleFlight
+
+
+def slow_call(calls, release, value):
+    calls.append(value)
+    release.wait(5)
+    return value
+
+
+def test_concurrent_calls_with_the_same_key_share_one_run():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    async def run():
+        waiting = [asyncio.ensure_future(flight.do("key", slow_call, calls, release, 1)) for _ in range(5)]
+        other = asyncio.ensure_future(flight.do("other", slow_call, calls, release, 2))
+        await asyncio.sleep(0.1)
+        release.set()
+        return await asyncio.gather(*waiting), await other
+
+    results, other = asyncio.run(run())
+
+    assert results == [1] * 5
+    assert other == 2
+    assert sorted(calls) == [1, 2]
+    assert flight.metrics()["coalesced"] == 4
+    assert flight.metrics()["in_flight"] == 0
+
+
+def test_errors_reach_every_caller_and_the_next_call_runs_again():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("boom")
+
+    async def run():
+        waiting = [asyncio.ensure_future(flight.do("key", failing)) for _ in range(3)]
+        await asyncio.sleep(0.1)
+        release.set()
+        return await asyncio.gather(*waiting, return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.executions == 1
+    assert asyncio.run(flight.do("key", lambda: "fresh")) == "fresh"
+    assert flight.executions == 2
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_run():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("key", slow_call, calls, release, 1))
+        second = asyncio.ensure_future(flight.do("key", slow_call, calls, release, 1))
+        await asyncio.sleep(0.1)
+        first.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == 1
+    assert calls == [1]
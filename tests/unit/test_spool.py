@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+
+from botocore.exceptions import EndpointConnectionError
+from sygno_api.api.spool import Spool, SpoolDrainer
+from sygno_api.utils import clients
+from sygno_api.utils import dbmethods as dbutils
+
+
+class FakeBatchTable:
+    """table collecting batch writes, failing the first `failures` batches"""
+
+    def __init__(self, failures=0):
+        self.items = []
+        self.failures = failures
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return self
+
+    def __enter__(self):
+        if self.failures:
+            self.failures -= 1
+            raise EndpointConnectionError(endpoint_url="http://dynamodb")
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+
+def item(index):
+    return {"id": "weather", "sk": f"2021-05-14T10:{index:02d}:00"}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_open_segments_are_recovered_as_sealed(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=10 ** 6)
+    for index in range(3):
+        spool.append(item(index))
+    # the process stops without sealing its active segment
+
+    recovered = Spool(str(tmp_path))
+
+    assert recovered.depth == 3
+    assert len(recovered.sealed_segments()) == 1
+    recovered.append(item(3))
+    # new segments sort after the recovered ones
+    assert recovered.active_path > recovered.sealed_segments()[-1]
+
+
+def test_segments_are_claimed_oldest_first_once_until_released(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=1)
+    for index in range(3):
+        spool.append(item(index))
+    first, second, third = spool.sealed_segments()
+
+    assert spool.claim() == first
+    assert spool.claim() == second
+    spool.release(first)
+    assert spool.claim() == first
+    spool.complete(first, 1)
+    assert spool.claim() == third
+    assert spool.claim() is None
+    assert spool.depth == 2
+    assert not os.path.exists(first)
+
+
+def test_torn_last_line_is_skipped(tmp_path, monkeypatch):
+    table = FakeBatchTable()
+    monkeypatch.setattr(dbutils, "get_db_table", lambda table_name: table)
+    spool = Spool(str(tmp_path), segment_bytes=10 ** 6)
+    spool.append(item(0))
+    spool.close()
+    path = spool.sealed_segments()[0]
+    with open(path, "a", encoding="utf-8") as fout:
+        fout.write(json.dumps(item(1))[:10])
+
+    drainer = SpoolDrainer(spool, "table", rate=1000)
+
+    assert drainer.drain_segment(path) == 2
+    assert table.items == [item(0)]
+
+
+def test_drainer_survives_connection_errors(tmp_path, monkeypatch):
+    table = FakeBatchTable(failures=2)
+    monkeypatch.setattr(dbutils, "get_db_table", lambda table_name: table)
+    spool = Spool(str(tmp_path), segment_bytes=1)
+    for index in range(3):
+        spool.append(item(index))
+    drainer = SpoolDrainer(spool, "table", rate=1000, poll_seconds=0.01)
+
+    drainer.start()
+    try:
+        assert wait_for(lambda: spool.depth == 0)
+    finally:
+        drainer.stop()
+
+    metrics = drainer.metrics()
+    assert sorted(entry["sk"] for entry in table.items) == [item(index)["sk"] for index in range(3)]
+    assert metrics["failures"] == 2
+    assert "EndpointConnectionError" in metrics["last_error"]
+    assert spool.sealed_segments() == []
+
+
+def test_spooled_writes_are_acknowledged_while_dynamodb_is_down(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from functions import app
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    # nothing listens on the discard port, every dynamoDB call fails to connect
+    monkeypatch.setattr(clients, "_manager", clients.ClientManager(
+        endpoint_url="http://127.0.0.1:9", connect_timeout=0.5, max_attempts=1
+    ))
+    monkeypatch.setattr(app.event_log, "local", threading.local())
+    spool = Spool(str(tmp_path), segment_bytes=1)
+    monkeypatch.setattr(app.sygno_api, "spool_drainer", SpoolDrainer(spool, "table"))
+    key = app.WRITE_KEYS[0]
+    body = {"data": {"ts": "2021-05-14T10:30:00+02:00", "name": "w", "rows": [["name", "value"], ["temp", 21.5]]}}
+
+    response = TestClient(app.app).post("/sygno/write_raw", json=body, headers={"x-api-key": key})
+
+    assert response.status_code == 202
+    assert spool.depth == 1